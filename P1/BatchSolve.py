@@ -0,0 +1,109 @@
+#region imports
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from ResistorNetwork import ResistorNetwork
+#endregion
+
+#region function definitions
+def FindNetlists(patterns):
+    """
+    Expands directories and glob patterns into a sorted list of netlist files.
+    :param patterns: list of directory names, file names or glob patterns
+    :return: a list of file names
+    """
+    files = set()
+    for p in patterns:
+        if os.path.isdir(p):
+            files.update(glob.glob(os.path.join(p, '*.txt')))
+        else:
+            files.update(f for f in glob.glob(p) if os.path.isfile(f))
+    return sorted(files)
+
+def SolveNetlistFile(args):
+    """
+    Worker: reads and solves one netlist.  Errors are caught and reported so one bad file does not stop the batch.
+    :param args: tuple of (file name, solve method, use cache)
+    :return: a dictionary with 'file', 'ok', 'error', 'seconds' and 'currents' ({resistor name: current})
+    """
+    filename, method, cache = args
+    t0 = time.perf_counter()
+    result = {'file': filename, 'ok': True, 'error': '', 'currents': {}}
+    try:
+        Net = ResistorNetwork()
+        Net.BuildNetworkFromFile(filename, cache=cache)
+        i = Net.SolveCircuit(method)
+        result['currents'] = {r.Name: float(c) for r, c in zip(Net.Resistors, i)}
+    except Exception as e:
+        result['ok'] = False
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    result['seconds'] = time.perf_counter() - t0
+    return result
+
+def WriteResult(result, out, writer):
+    """
+    Streams one result to the output, as a JSON line or as one CSV row per resistor.
+    :param result: dictionary returned by SolveNetlistFile
+    :param out: open output file
+    :param writer: csv writer, or None for JSON lines
+    :return: nothing
+    """
+    if writer is None:
+        out.write(json.dumps(result) + '\n')
+        return
+    status = 'ok' if result['ok'] else 'failed'
+    if len(result['currents']) == 0:
+        writer.writerow([result['file'], status, '{:.6f}'.format(result['seconds']), result['error'], '', ''])
+    for name, c in result['currents'].items():
+        writer.writerow([result['file'], status, '{:.6f}'.format(result['seconds']), result['error'], name, repr(c)])
+
+def main(argv=None):
+    """
+    Solves every netlist in a set of directories or glob patterns across a process pool and streams the results
+    to a JSONL or CSV file.  Files are handed to the pool a chunk at a time, so memory stays bounded no matter
+    how many netlists there are.  A summary of throughput and failures is printed at the end.
+    :param argv: command line arguments (default sys.argv[1:])
+    :return: the number of files that failed
+    """
+    parser = argparse.ArgumentParser(description='Solve a batch of resistor network netlists.')
+    parser.add_argument('inputs', nargs='+', help='directories (all *.txt files) or glob patterns of netlists')
+    parser.add_argument('-o', '--output', default='-', help='output file, .csv for CSV, otherwise JSON lines (- for stdout)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--chunk', type=int, default=1000, help='files handed to the pool at a time')
+    parser.add_argument('--method', default='direct', choices=['direct', 'cg'], help='solve method')
+    parser.add_argument('--cache', action='store_true', help='use compiled netlist caches')
+    args = parser.parse_args(argv)
+
+    files = FindNetlists(args.inputs)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    writer = None
+    if args.output.lower().endswith('.csv'):
+        writer = csv.writer(out)
+        writer.writerow(['file', 'status', 'seconds', 'error', 'resistor', 'current'])
+    nFailed = 0
+    t0 = time.perf_counter()
+    try:
+        with Pool(max(1, args.jobs)) as pool:
+            for c0 in range(0, len(files), args.chunk):
+                tasks = [(f, args.method, args.cache) for f in files[c0:c0 + args.chunk]]
+                for result in pool.imap_unordered(SolveNetlistFile, tasks, chunksize=max(1, len(tasks) // (4 * max(1, args.jobs)))):
+                    WriteResult(result, out, writer)
+                    nFailed += 0 if result['ok'] else 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - t0
+    print('Solved {} netlists in {:0.2f} s ({:0.1f} files/s), {} failed'.format(
+        len(files), elapsed, len(files) / elapsed if elapsed > 0 else 0.0, nFailed), file=sys.stderr)
+    return nFailed
+#endregion
+
+#region function calls
+if __name__ == "__main__":
+    sys.exit(1 if main() > 0 else 0)
+#endregion
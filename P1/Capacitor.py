@@ -0,0 +1,16 @@
+#region classes
+class Capacitor():
+    #region constructor
+    def __init__(self, C=1.0e-6, name='ab'):
+        """
+        Defines a capacitor to have a self.Capacitance and self.Name.  A capacitor is an open circuit in DC
+        analysis and has admittance j*w*C in AC analysis.
+        :param C: capacitance in F (float)
+        :param name: name of capacitor by alphabetically ordered pair of node names
+        """
+        #region attributes
+        self.Capacitance = C
+        self.Name = name
+        #endregion
+    #endregion
+#endregion
@@ -0,0 +1,16 @@
+#region classes
+class Inductor():
+    #region constructor
+    def __init__(self, L=1.0e-3, name='ab'):
+        """
+        Defines an inductor to have a self.Inductance and self.Name.  An inductor is a short circuit in DC
+        analysis and has admittance 1/(j*w*L) in AC analysis.
+        :param L: inductance in H (float)
+        :param name: name of inductor by alphabetically ordered pair of node names
+        """
+        #region attributes
+        self.Inductance = L
+        self.Name = name
+        #endregion
+    #endregion
+#endregion
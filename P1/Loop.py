@@ -3,10 +3,13 @@ class Loop():
     #region constructor
     def __init__(self):
         """
-        Defines a loop as a list of node names.
+        Defines a loop as a list of node names.  Loops found from the network topology also list the
+        element traversed between each pair of nodes, which tells apart elements connected in parallel.
         """
         #region attributes
+        self.Name = ''
         self.Nodes = []
+        self.Elements = []  # optional, Elements[k] joins Nodes[k] to the next node
         #endregion
     #endregion
 #endregion
\ No newline at end of file
@@ -1,223 +1,969 @@
 #region imports
-from scipy.optimize import fsolve
+import hashlib
+import os
+import warnings
+from collections import deque
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import cg, spilu, LinearOperator
+from scipy.sparse.csgraph import connected_components
 from Resistor import Resistor
 from VoltageSource import VoltageSource
+from Capacitor import Capacitor
+from Inductor import Inductor
 from Loop import Loop
 #endregion
 
+CACHE_VERSION = 2  # bump when the layout of the compiled netlist cache changes
+
 #region class definitions
 class ResistorNetwork:
     #constructor assigned
     def __init__(self):
         """
-        The resistor network consists of Loops, Resistors and Voltage Sources.
+        The resistor network consists of Loops, Resistors and Voltage Sources, plus optional Capacitors and
+        Inductors for AC analysis.
         This is the constructor for the network and it defines fields for Loops, Resistors and Voltage Sources.
         You can populate these lists manually or read them in from a file.
          """
         self.Loops = [] #initialize empty loop list in network
         self.Resistors = [] #initialize empty list of resistors
         self.VSources = [] #initialize empty list of Vsource objects in network
+        self.Capacitors = [] #open circuits in DC analysis
+        self.Inductors = [] #short circuits in DC analysis
         #endregion
 #endregion
 
-    def BuildNetworkFromFile(self, filename):
+    def BuildNetworkFromFile(self, filename, cache=False):
         """
         This function reads the lines from a file and processes the file to populate the fields
-        for Loops, Resistors and Voltage Sources
+        for Loops, Resistors and Voltage Sources.  If the file has no <Loop> blocks, none of the solvers needs
+        loops, so an independent set is only found from the topology when GetLoopVoltageDrops asks for them.
+        :param filename: string for file to process
+        :param cache: if True, reuse (or write) a compiled binary copy of the netlist next to the file so that
+                      reloading an unchanged netlist skips the text parsing
+        :return: nothing
+        """
+        if cache and self.LoadNetworkCache(filename):
+            return
+        self.ParseNetlist(filename)
+        self.CompileNetlist()
+        if cache:
+            self.SaveNetworkCache(filename)
+
+    def ParseNetlist(self, filename):
+        """
+        Reads a netlist in a single streaming pass, one line at a time, so memory does not depend on the file size.
+        The parser is a small state machine: outside a block it looks for an opening tag (<Resistor>, <Source>,
+        <Capacitor>, <Inductor> or <Loop>); inside a block it reads 'key = value' lines until the matching closing tag.
         :param filename: string for file to process
         :return: nothing
         """
-        FileTxt = open(filename, "r").read().split('\n') # reads from file and then splits the string at the new line characters
-        LineNum = 0 # a counting variable to point to the line of text to be processed from FileTxt
         #erase previous values
         self.Resistors = []
         self.VSources = []
+        self.Capacitors = []
+        self.Inductors = []
         self.Loops = []
-        FileLength = len(FileTxt)
-        while LineNum < FileLength:
-            lineTxt = FileTxt[LineNum].lower().strip()
-            if len(lineTxt) < 1 or lineTxt[0] == '#':
-                pass #skips insignificant values in text
-            elif "resistor" in lineTxt:
-                LineNum = self.MakeResistor(LineNum, FileTxt)
-            elif "source" in lineTxt:
-                LineNum = self.MakeVSource(LineNum, FileTxt)
-            elif "loop" in lineTxt:
-                LineNum = self.MakeLoop(LineNum, FileTxt)
-            LineNum += 1 #update to linenum from zero in loop
-
-    def MakeResistor(self, N, Txt):
-        """
-        Make a resistor object from reading the text file
-        :param N: (int) Line number for current processing
-        :param Txt: [string] the lines of the text file
-        :return: a resistor object
-        """
-        R = Resistor() #instantiate resistor object
-        N += 1 #once resistor detected move to next text line
-        txt = Txt[N].lower() #make txt line lower case
-        while "resistor" not in txt:
-            if "name" in txt:
-                R.Name = txt.split('=')[1].strip()
-            if "resistance" in txt:
-                R.Resistance = float(txt.split('=')[1].strip())
-            N += 1
-            txt = Txt[N].lower() #lowercase
-        self.Resistors.append(R) #append object to resistor list
-        return N
-
-    def MakeVSource(self, N, Txt):
-        VS = VoltageSource()
-        N += 1
-        txt = Txt[N].lower()
-        while "source" not in txt:
-            if "name" in txt:
-                VS.Name = txt.split('=')[1].strip()
-            if "value" in txt:
-                VS.Voltage = float(txt.split('=')[1].strip())
-            if "type" in txt:
-                VS.Type = txt.split('=')[1].strip()
-            N += 1
-            txt = Txt[N].lower()
-        self.VSources.append(VS)
-        return N
-
-    def MakeLoop(self, N, Txt):
-        """
-        Make a resistor object from reading the text file
-        :param N: (int) Line number for current processing
-        :param Txt: [string] the lines of the text file
-        :return: a resistor object
-        """
-        L = Loop()
-        N += 1
-        txt = Txt[N].lower()
-        while "loop" not in txt:
-            if "name" in txt:
-                L.Name = txt.split('=')[1].strip()
-            if "nodes" in txt:
-                txt = txt.replace(" ", "")
-                L.Nodes = txt.split('=')[1].strip().split(',')
-            N += 1
-            txt = Txt[N].lower()
-        self.Loops.append(L)
-        return N
-
-    def AnalyzeCircuit(self):
-        """
-        fsolve for currents in network 1
-        :return:
-        """
-        i0 = [0, 0, 0] #initial guess defined for circuit currents
-        i = fsolve(self.GetKirchoffVals, i0) #fsolve Kirchoff vals for current
-        #print each value for current of network
-        print("I1 = {:0.1f}".format(i[0]))
-        print("I2 = {:0.1f}".format(i[1]))
-        print("I3 = {:0.1f}".format(i[2]))
+        openers = {'resistor': Resistor, 'source': VoltageSource, 'capacitor': Capacitor, 'inductor': Inductor, 'loop': Loop}
+        lists = {'resistor': self.Resistors, 'source': self.VSources, 'capacitor': self.Capacitors,
+                 'inductor': self.Inductors, 'loop': self.Loops}
+        block = None  # tag of the block being read, None when between blocks
+        element = None
+        with open(filename, "r") as f:
+            for LineNum, line in enumerate(f, 1):
+                lineTxt = line.lower().strip()
+                if len(lineTxt) < 1 or lineTxt[0] == '#':
+                    continue #skips insignificant values in text
+                if lineTxt[0] == '<' and lineTxt[-1] == '>':
+                    tag = lineTxt[1:-1].strip()
+                    if tag[0] == '/':
+                        if tag[1:].strip() != block:
+                            raise ValueError("{} line {}: unexpected closing tag <{}>".format(filename, LineNum, tag))
+                        lists[block].append(element)
+                        block = None
+                    elif block is not None:
+                        raise ValueError("{} line {}: <{}> opened before </{}> was closed".format(filename, LineNum, tag, block))
+                    elif tag in openers:
+                        block = tag
+                        element = openers[tag]()
+                    else:
+                        raise ValueError("{} line {}: unknown tag <{}>".format(filename, LineNum, tag))
+                elif block is not None:
+                    try:
+                        self.SetElementField(element, block, lineTxt)
+                    except ValueError as e:
+                        raise ValueError("{} line {}: {}".format(filename, LineNum, e)) from None
+        if block is not None:
+            raise ValueError("{}: missing closing tag </{}>".format(filename, block))
+
+    def SetElementField(self, element, block, lineTxt):
+        """
+        Applies one 'key = value' line of a netlist block to the element being built.
+        :param element: the Resistor, VoltageSource, Capacitor, Inductor or Loop object being built
+        :param block: tag of the block ('resistor', 'source', 'capacitor', 'inductor' or 'loop')
+        :param lineTxt: the lower case, stripped line of text
+        :return: nothing
+        :raises ValueError: for a line that is not 'key = value', a key the block does not have or a value that is
+                            not a number where one is needed
+        """
+        key, eq, value = lineTxt.partition('=')
+        key, value = key.strip(), value.strip()
+        if not eq:
+            raise ValueError("expected 'key = value' in <{}>, got '{}'".format(block, lineTxt))
+
+        def number():
+            try:
+                return float(value)
+            except ValueError:
+                raise ValueError("{} = '{}' in <{}> is not a number".format(key, value, block)) from None
+
+        if key == 'name':
+            element.Name = value
+        elif key == 'resistance' and block == 'resistor':
+            element.Resistance = number()
+        elif key == 'value' and block == 'source':
+            element.Voltage = number()
+        elif key == 'type' and block == 'source':
+            element.Type = value
+        elif key == 'capacitance' and block == 'capacitor':
+            element.Capacitance = number()
+        elif key == 'inductance' and block == 'inductor':
+            element.Inductance = number()
+        elif key == 'nodes' and block == 'loop':
+            element.Nodes = [n.strip() for n in value.split(',')]
+        else:
+            raise ValueError("unknown key '{}' in <{}>".format(key, block))
+
+    def GetCachePath(self, filename):
+        """
+        :param filename: netlist file name
+        :return: name of the compiled binary cache for that netlist
+        """
+        return filename + '.cache.npz'
+
+    def GetFileHash(self, filename):
+        """
+        Hashes a file in fixed size chunks.
+        :param filename: file to hash
+        :return: sha1 hex digest of the file contents
+        """
+        h = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def SaveNetworkCache(self, filename, sha1=None):
+        """
+        Writes the parsed network to a compiled binary (.npz) cache keyed by the netlist's mtime, size and hash.
+        :param filename: the netlist file the network was read from
+        :param sha1: the netlist's hash if it is already known (it is computed otherwise)
+        :return: nothing
+        """
+        st = os.stat(filename)
+        sha1 = self.GetFileHash(filename) if sha1 is None else sha1
+        column = {id(e): k for k, e in enumerate(self.Resistors + self.VSources)}
+        loopNodes, loopPtr, loopElements = [], [0], []
+        for L in self.Loops:
+            loopNodes += L.Nodes
+            loopPtr.append(len(loopNodes))
+            loopElements += [column[id(e)] for e in L.Elements] if len(L.Elements) > 0 else [-1] * len(L.Nodes)
+        try:
+            with open(self.GetCachePath(filename), 'wb') as f:
+                np.savez(f, version=CACHE_VERSION, mtime=st.st_mtime_ns, size=st.st_size, sha1=sha1,
+                         r_names=np.array([r.Name for r in self.Resistors], dtype=str), r_values=self.R,
+                         s_names=np.array([v.Name for v in self.VSources], dtype=str), s_values=self.E,
+                         s_types=np.array([getattr(v, 'Type', '') for v in self.VSources], dtype=str),
+                         c_names=np.array([e.Name for e in self.Capacitors], dtype=str), c_values=self.C,
+                         l_names=np.array([e.Name for e in self.Inductors], dtype=str), l_values=self.L,
+                         loop_names=np.array([L.Name for L in self.Loops], dtype=str),
+                         loop_nodes=np.array(loopNodes, dtype=str), loop_ptr=np.array(loopPtr, dtype=int),
+                         loop_elements=np.array(loopElements, dtype=int))
+        except OSError as e:
+            warnings.warn("Could not write netlist cache: {}".format(e))
+
+    def LoadNetworkCache(self, filename):
+        """
+        Populates the network from the compiled cache if it exists and still matches the netlist file.
+        The cache is valid if the file's mtime and size are unchanged, or failing that, if its hash is unchanged.
+        :param filename: the netlist file
+        :return: True if the network was loaded from the cache, False otherwise
+        """
+        path = self.GetCachePath(filename)
+        if not os.path.exists(path):
+            return False
+        st = os.stat(filename)
+        with np.load(path, allow_pickle=False) as c:
+            if int(c['version']) != CACHE_VERSION:
+                return False
+            sha1 = None  # set when the file had to be hashed to match the cache
+            if (int(c['mtime']), int(c['size'])) != (st.st_mtime_ns, st.st_size):
+                sha1 = self.GetFileHash(filename)
+                if str(c['sha1']) != sha1:
+                    return False
+            self.Resistors = [Resistor(R, name=n) for n, R in zip(c['r_names'].tolist(), c['r_values'].tolist())]
+            self.VSources = []
+            for n, V, t in zip(c['s_names'].tolist(), c['s_values'].tolist(), c['s_types'].tolist()):
+                VS = VoltageSource(V, n)
+                if t:
+                    VS.Type = t
+                self.VSources.append(VS)
+            self.Capacitors = [Capacitor(C, n) for n, C in zip(c['c_names'].tolist(), c['c_values'].tolist())]
+            self.Inductors = [Inductor(L, n) for n, L in zip(c['l_names'].tolist(), c['l_values'].tolist())]
+            elements = self.Resistors + self.VSources
+            nodes, ptr, cols = c['loop_nodes'].tolist(), c['loop_ptr'].tolist(), c['loop_elements'].tolist()
+            self.Loops = []
+            for k, name in enumerate(c['loop_names'].tolist()):
+                L = Loop()
+                L.Name = name
+                L.Nodes = nodes[ptr[k]:ptr[k + 1]]
+                if ptr[k + 1] > ptr[k] and cols[ptr[k]] >= 0:
+                    L.Elements = [elements[e] for e in cols[ptr[k]:ptr[k + 1]]]
+                self.Loops.append(L)
+        self.CompileNetlist()
+        if sha1 is not None:
+            self.SaveNetworkCache(filename, sha1)  # store the new mtime, so later loads skip the hash again
+        return True
+
+    def GetElementNodes(self, name):
+        """
+        Splits an element name into the names of the two nodes it connects.  Element names are either an
+        ordered pair of one letter node names (e.g., 'ad') or two node names joined by a dash (e.g., 'n12-n13').
+        :param name: (string) name of a resistor or voltage source
+        :return: a tuple of (first node name, second node name)
+        """
+        if '-' in name:
+            n1, n2 = name.split('-', 1)
+            return n1.strip(), n2.strip()
+        return name[0], name[1:]
+
+    def GetNodeNames(self):
+        """
+        Collects the names of all nodes touched by a resistor, voltage source, capacitor or inductor.
+        :return: a sorted list of node names
+        """
+        nodes = set()
+        for e in self.Resistors + self.VSources + self.Capacitors + self.Inductors:
+            nodes.update(self.GetElementNodes(e.Name))
+        return sorted(nodes)
+
+    def CompileNetlist(self):
+        """
+        Compiles the element lists into arrays so that lookups are O(1) and loop sums are one mat-vec.
+        Sets a name -> index hash for nodes, resistors and sources, NumPy arrays of resistance (self.R),
+        current (self.I) and source voltage (self.E), and the node indices at both ends of every element, all in
+        O(elements).  The signed loop-element incidence matrix (self.LoopMatrix) is cleared here and built by
+        GetLoopVoltageDrops when loops are needed, since the nodal solvers do not use it.  Element columns are
+        ordered resistors first, then sources.  Capacitances (self.C) and inductances (self.L) are compiled too,
+        but they are not part of the loop equations.  Call again after editing the element or Loops lists.
+        :return: nothing
+        """
+        nodes = self.GetNodeNames()
+        self.NodeIndex = {n: k for k, n in enumerate(nodes)}  # node name -> node index
+        self.ResistorIndex = {r.Name: k for k, r in enumerate(self.Resistors)}
+        self.SourceIndex = {v.Name: k for k, v in enumerate(self.VSources)}
+        self.CapacitorIndex = {e.Name: k for k, e in enumerate(self.Capacitors)}
+        self.InductorIndex = {e.Name: k for k, e in enumerate(self.Inductors)}
+        self.R = np.array([r.Resistance for r in self.Resistors], dtype=float)
+        self.I = np.array([r.Current for r in self.Resistors], dtype=float)
+        self.E = np.array([v.Voltage for v in self.VSources], dtype=float)
+        self.C = np.array([e.Capacitance for e in self.Capacitors], dtype=float)
+        self.L = np.array([e.Inductance for e in self.Inductors], dtype=float)
+        # element end points.  Positive current flows from the first node to the second node.
+        ends = [self.GetElementNodes(e.Name) for e in self.Resistors + self.VSources + self.Capacitors + self.Inductors]
+        start = np.array([self.NodeIndex[a] for a, b in ends], dtype=int)
+        end = np.array([self.NodeIndex[b] for a, b in ends], dtype=int)
+        n1 = len(self.Resistors)
+        n2 = n1 + len(self.VSources)
+        n3 = n2 + len(self.Capacitors)
+        self.RStart, self.REnd = start[:n1], end[:n1]
+        self.SStart, self.SEnd = start[n1:n2], end[n1:n2]
+        self.CStart, self.CEnd = start[n2:n3], end[n2:n3]
+        self.LStart, self.LEnd = start[n3:], end[n3:]
+
+        # (node, node) -> (element column, +1 if traversed in name order else -1).  Resistors take precedence
+        # over a source between the same nodes, as GetElementDeltaV always did.
+        self.EdgeIndex = {}
+        for k in range(n2 - 1, -1, -1):
+            a, b = start[k], end[k]
+            self.EdgeIndex[(a, b)] = (k, 1)
+            self.EdgeIndex[(b, a)] = (k, -1)
+        self.LoopMatrix = None  # built on demand by GetLoopVoltageDrops
+
+    def BuildLoopMatrix(self):
+        """
+        Builds the signed loop-element incidence matrix.  Entry (loop, element) is +1 if the loop traverses the
+        element from its first node to its second, -1 for the opposite direction and 0 if the element is not in it.
+        :return: a scipy.sparse csr matrix with one row per loop and one column per element
+        """
+        column = {id(e): k for k, e in enumerate(self.Resistors + self.VSources)}
+        start = np.concatenate((self.RStart, self.SStart))
+        rows, cols, signs = [], [], []
+        for l, L in enumerate(self.Loops):
+            n = len(L.Nodes)
+            for k in range(n):
+                a, b = self.NodeIndex[L.Nodes[k]], self.NodeIndex[L.Nodes[(k + 1) % n]]
+                if len(L.Elements) > 0:
+                    c = column[id(L.Elements[k])]
+                    sign = 1 if start[c] == a else -1
+                else:
+                    c, sign = self.EdgeIndex[(a, b)]
+                rows.append(l)
+                cols.append(c)
+                signs.append(sign)
+        return coo_matrix((signs, (rows, cols)), shape=(len(self.Loops), len(self.R) + len(self.E))).tocsr()
+
+    def MergeSuperNodes(self, start, end, volts):
+        """
+        Walks the voltage sources to assign each node a supernode and an offset voltage within that supernode.
+        :param start: first node index of each source
+        :param end: second node index of each source
+        :param volts: voltage of each source, rising from the first node to the second
+        :return: (supernode of each node, offset of each node, source tree, number of supernodes) where the
+                 source tree lists (node, parent node, source, sign) in the order the offsets were assigned
+        """
+        nN = len(self.NodeIndex)
+        adj = [[] for n in range(nN)]
+        for k, (a, b) in enumerate(zip(start, end)):
+            adj[a].append((b, k, 1))  # voltage increases going from a to b
+            adj[b].append((a, k, -1))
+        superNode = np.full(nN, -1, dtype=int)
+        offset = np.zeros(nN)
+        tree = []
+        nS = 0
+        for root in range(nN):
+            if superNode[root] >= 0:
+                continue
+            superNode[root] = nS
+            stack = [root]
+            while stack:
+                a = stack.pop()
+                for b, k, sign in adj[a]:
+                    dV = sign * volts[k]
+                    if superNode[b] < 0:
+                        superNode[b] = nS
+                        offset[b] = offset[a] + dV
+                        tree.append((b, a, k, sign))
+                        stack.append(b)
+                    elif abs(offset[b] - offset[a] - dV) > 1e-9 * max(1.0, abs(dV)):
+                        raise ValueError("Voltage sources form a loop with inconsistent voltages")
+            nS += 1
+        return superNode, offset, tree, nS
+
+    def GroundSuperNodes(self, p, q, nS):
+        """
+        Grounds the first supernode of each connected part of the circuit and numbers the rest as unknowns.
+        :param p: supernode at the first end of each branch between supernodes
+        :param q: supernode at the second end of each branch
+        :param nS: number of supernodes
+        :return: an array mapping supernode -> unknown index, -1 if grounded
+        """
+        nComp, comp = connected_components(coo_matrix((np.ones(len(p)), (p, q)), shape=(nS, nS)), directed=False)
+        grounded = np.zeros(nS, dtype=bool)
+        grounded[np.unique(comp, return_index=True)[1]] = True
+        unknown = np.full(nS, -1, dtype=int)
+        unknown[~grounded] = np.arange(nS - nComp)
+        return unknown
+
+    def BuildNodalSystem(self):
+        """
+        Builds the reduced nodal equations for the network directly from its topology.
+        Capacitors are open circuits and inductors are short circuits here.
+        Nodes joined by voltage sources are merged into a supernode whose node voltages are fixed offsets
+        from the supernode potential, so only one unknown is needed per supernode.  One supernode in each
+        connected part of the circuit is grounded.  What remains is the conductance (Laplacian) matrix of the
+        resistors between supernodes, which is symmetric positive definite.
+        :return: (rows, cols, vals, b) where rows, cols, vals are the nonzero entries of the conductance matrix
+                 and b is the right hand side, both indexed by unknown
+        """
+        self.CompileNetlist()
+        nN = len(self.NodeIndex)
+        self.G = 1.0 / self.R
+
+        # inductors are shorts in DC, so they join supernodes like 0V sources
+        self.SuperNode, self.Offset, self.SourceTree, nS = self.MergeSuperNodes(
+            np.concatenate((self.SStart, self.LStart)), np.concatenate((self.SEnd, self.LEnd)),
+            np.concatenate((self.E, np.zeros(len(self.L)))))
+
+        # resistors between supernodes give the conductance matrix, resistors inside a supernode are fixed by the sources
+        p = self.SuperNode[self.RStart]
+        q = self.SuperNode[self.REnd]
+        self.Live = live = p != q
+        p, q, g = p[live], q[live], self.G[live]
+        self.Unknown = self.GroundSuperNodes(p, q, nS)
+
+        # stamp each resistor: g on both diagonals, -g on the off diagonals
+        self.LiveStart, self.LiveEnd = up, uq = self.Unknown[p], self.Unknown[q]
+        rows = np.concatenate((up, uq, up, uq))
+        cols = np.concatenate((up, uq, uq, up))
+        vals = np.concatenate((g, g, -g, -g))
+        keep = (rows >= 0) & (cols >= 0)
+        return rows[keep], cols[keep], vals[keep], self.BuildRightHandSide()
+
+    def BuildRightHandSide(self):
+        """
+        Right hand side of the nodal equations: the currents driven through the resistors between supernodes by
+        the source offsets.  Depends only on the conductances and offsets, not on the factorization.
+        :return: an array indexed by unknown
+        """
+        up, uq = self.LiveStart, self.LiveEnd
+        ig = self.G[self.Live] * (self.Offset[self.RStart] - self.Offset[self.REnd])[self.Live]
+        b = np.zeros(int(self.Unknown.max()) + 1 if len(self.Unknown) else 0)
+        np.add.at(b, up[up >= 0], -ig[up >= 0])
+        np.add.at(b, uq[uq >= 0], ig[uq >= 0])
+        return b
+
+    def UpdateOffsets(self):
+        """
+        Recomputes the node offsets inside each supernode after source voltages change, using the source
+        spanning tree found by BuildNodalSystem.
+        :return: nothing
+        """
+        volts = np.concatenate((self.E, np.zeros(len(self.L))))
+        for b, a, k, sign in self.SourceTree:
+            self.Offset[b] = self.Offset[a] + sign * volts[k]
+        gap = self.Offset[self.SEnd] - self.Offset[self.SStart] - self.E
+        if np.any(np.abs(gap) > 1e-9 * np.maximum(1.0, np.abs(self.E))):
+            raise ValueError("Voltage sources form a loop with inconsistent voltages")
+
+    def SetCurrents(self, u):
+        """
+        Recovers node voltages from the supernode potentials and stores the current in each resistor.
+        :param u: solution of the reduced nodal equations
+        :return: an array of resistor currents in the order of self.Resistors
+        """
+        U = np.append(u, 0.0)[self.Unknown]  # grounded supernodes index the trailing zero
+        self.NodeVoltages = U[self.SuperNode] + self.Offset
+        i = self.G * (self.NodeVoltages[self.RStart] - self.NodeVoltages[self.REnd])
+        self.I = i
+        for r, c in zip(self.Resistors, i):
+            r.Current = c
+            r.DeltaV()
+        return i
+
+    def SolveCircuit(self, method='direct', precond='ilu', tol=1e-10, maxiter=None, reduce=None, keep=None):
+        """
+        Solves the nodal equations without printing anything.
+        method='direct' assembles a dense conductance matrix and solves it with a Cholesky factorization, which
+        is kept so Resolve can reuse it after element edits.
+        method='cg' assembles a scipy.sparse matrix and solves it by preconditioned conjugate gradient, which
+        keeps memory linear in the number of elements for large grids and meshes.  The reduced conductance
+        matrix is symmetric positive definite, so CG always applies.
+        Optionally the system is shrunk before solving (see ReduceNodalSystem) and the eliminated node voltages
+        are back substituted afterwards, so every resistor still gets its current.
+        :param method: 'direct' or 'cg'
+        :param precond: preconditioner for 'cg': 'amg' (needs pyamg), 'ilu' (incomplete factorization), 'jacobi' or None
+        :param tol: relative residual tolerance for 'cg'
+        :param maxiter: iteration limit for 'cg' (default is scipy's)
+        :param reduce: None, 'series' to collapse series chains and parallel banks, or 'kron' to also eliminate
+                       every node not listed in keep
+        :param keep: names of nodes of interest that are never eliminated
+        :return: an array of resistor currents in the order of self.Resistors
+        """
+        rows, cols, vals, b = self.BuildNodalSystem()
+        n = len(b)
+        self.SolverInfo = {'method': method, 'unknowns': n, 'reducedUnknowns': n, 'iterations': 0, 'residual': 0.0}
+        self.SolverOptions = {'precond': precond, 'tol': tol, 'maxiter': maxiter, 'reduce': reduce, 'keep': keep}
+        self.Factor = None
+        self.Topology = self.GetTopologyKey()
+        if n == 0:
+            self.Solution = b
+            return self.SetCurrents(b)
+        A = coo_matrix((vals, (rows, cols)), shape=(n, n)).tocsr()  # duplicate stamps are summed
+        steps = None
+        if reduce is not None:
+            A, b, steps = self.ReduceNodalSystem(A, b, reduce, keep)
+            self.SolverInfo['reducedUnknowns'] = len(b)
+        if len(b) == 0:
+            u = b
+        elif method == 'direct':
+            A = A.toarray()
+            F = cho_factor(A)
+            if steps is None:
+                self.Factor = F  # the Woodbury updates in Resolve need the factorization of the full system
+                self.FactorG = self.G[self.Live].copy()  # conductances the factorization was built with
+            u = cho_solve(F, b)
+        elif method == 'cg':
+            iters = [0]
+
+            def count(xk):
+                iters[0] += 1
+
+            x0 = self.Solution if steps is None and len(getattr(self, 'Solution', [])) == n else None  # warm start
+            u, flag = cg(A, b, x0=x0, rtol=tol, maxiter=maxiter, M=self.GetPreconditioner(A, precond), callback=count)
+            if flag > 0:
+                warnings.warn("CG did not converge in {} iterations".format(flag))
+            self.SolverInfo['iterations'] = iters[0]
+        else:
+            raise ValueError("Unknown solve method '{}'".format(method))
+        bnorm = np.linalg.norm(b)
+        self.SolverInfo['residual'] = np.linalg.norm(b - A @ u) / (bnorm if bnorm > 0 else 1.0)
+        if steps is not None:
+            u = self.ExpandSolution(u, steps, n)
+        self.Solution = u
+        return self.SetCurrents(u)
+
+    def ReduceNodalSystem(self, A, b, reduce='series', keep=None):
+        """
+        Shrinks the nodal equations by eliminating unknowns (Kron reduction, i.e. a Schur complement).
+        Parallel resistors are already combined because their stamps are summed.  With reduce='series', only
+        unknowns joined to at most two others are eliminated, which is exactly collapsing series chains and
+        dangling branches into single equivalent resistors and adds no fill.  With reduce='kron', every unknown
+        not in keep is eliminated.  Each pass eliminates an independent set of eligible unknowns, so the block
+        being eliminated is diagonal and the Schur complement stays a sparse product.
+        :param A: sparse (csr) conductance matrix
+        :param b: right hand side
+        :param reduce: 'series' or 'kron'
+        :param keep: names of nodes that must stay in the reduced system
+        :return: (reduced A, reduced b, elimination steps for ExpandSolution)
+        """
+        if reduce not in ('series', 'kron'):
+            raise ValueError("Unknown reduction '{}'".format(reduce))
+        maxDegree = 2 if reduce == 'series' else None
+        n = len(b)
+        eligible = np.ones(n, dtype=bool)
+        for name in keep or []:
+            u = self.Unknown[self.SuperNode[self.NodeIndex[name]]]
+            if u >= 0:
+                eligible[u] = False
+        alive = np.arange(n)  # original unknown index of each row of A
+        steps = []
+        while True:
+            m = A.shape[0]
+            rowOf = np.repeat(np.arange(m), np.diff(A.indptr))
+            offDiag = A.indices != rowOf
+            degree = np.bincount(rowOf[offDiag], minlength=m)
+            cand = eligible.copy()
+            if maxDegree is not None:
+                cand &= degree <= maxDegree
+            # an eligible unknown is eliminated unless a neighbour with a lower (degree, index) is also eligible
+            key = degree * m + np.arange(m)
+            clash = offDiag & cand[rowOf] & cand[A.indices] & (key[A.indices] < key[rowOf])
+            cand[rowOf[clash]] = False
+            I, B = np.nonzero(cand)[0], np.nonzero(~cand)[0]
+            if len(I) == 0:
+                break
+            D = A.diagonal()[I]
+            AIB = A[I][:, B]
+            ABI = AIB.T.tocsr()  # A is symmetric
+            steps.append((alive[I], alive[B], D, AIB, b[I]))
+            A = (A[B][:, B] - ABI @ (AIB.multiply(1.0 / D[:, None]))).tocsr()
+            A.eliminate_zeros()
+            b = b[B] - ABI @ (b[I] / D)
+            alive, eligible = alive[B], eligible[B]
+        return A, b, steps
+
+    def ExpandSolution(self, u, steps, n):
+        """
+        Back substitutes the unknowns eliminated by ReduceNodalSystem, last pass first.
+        :param u: solution of the reduced system
+        :param steps: elimination steps returned by ReduceNodalSystem
+        :param n: number of unknowns in the full system
+        :return: the solution of the full system
+        """
+        full = np.zeros(n)
+        if len(steps) > 0:
+            full[steps[-1][1]] = u
+        else:
+            return u
+        for I, B, D, AIB, bI in reversed(steps):
+            full[I] = (bI - AIB @ full[B]) / D
+        return full
+
+    def GetTopologyKey(self):
+        """
+        Identifies the element lists a solve was built from, so cached factorizations can be thrown away when
+        elements are added, removed or renamed.
+        :return: a hashable key
+        """
+        return (tuple(id(e) for e in self.Resistors), tuple(id(e) for e in self.VSources),
+                tuple(e.Name for e in self.Resistors), tuple(e.Name for e in self.VSources),
+                tuple(e.Name for e in self.Inductors))
+
+    def UpdateElement(self, name, value, kind=None):
+        """
+        Changes one element value ahead of a call to Resolve.  The Resistor/VoltageSource object is updated too.
+        Where a resistor and a source share a name, the resistor is changed unless kind='source'.
+        :param name: element name
+        :param value: new resistance in Ohm or source voltage in V
+        :param kind: optional 'resistor' or 'source'
+        :return: nothing
+        """
+        if getattr(self, 'Topology', None) != self.GetTopologyKey():
+            self.CompileNetlist()  # elements changed since the last solve, Resolve will start over
+        if kind != 'source' and name in self.ResistorIndex:
+            k = self.ResistorIndex[name]
+            self.Resistors[k].Resistance = value
+            self.R[k] = value
+            if hasattr(self, 'G') and len(self.G) == len(self.R):
+                self.G[k] = 1.0 / value
+        elif kind != 'resistor' and name in self.SourceIndex:
+            k = self.SourceIndex[name]
+            self.VSources[k].Voltage = value
+            self.E[k] = value
+            self.SourcesChanged = True
+        else:
+            raise KeyError("No element named '{}'".format(name))
+
+    def Resolve(self, maxUpdates=None):
+        """
+        Re-solves the circuit after UpdateElement calls, reusing the previous work where it can.
+        Source changes only change the right hand side.  Resistance changes are low rank updates of the
+        conductance matrix, applied to the cached Cholesky factorization with the Woodbury identity
+        (Sherman-Morrison for a single resistor).  When too many resistors have changed, or the element lists
+        themselves changed, the system is rebuilt and refactored.  After a 'cg' solve, the new solve is warm
+        started from the previous solution instead.
+        :param maxUpdates: refactor once more than this many resistors differ from the factorization
+                           (default max(16, unknowns/10))
+        :return: an array of resistor currents in the order of self.Resistors
+        """
+        method = getattr(self, 'SolverInfo', {}).get('method', 'direct')
+        if getattr(self, 'Topology', None) != self.GetTopologyKey() or method != 'direct' or self.Factor is None:
+            return self.SolveCircuit(method, **getattr(self, 'SolverOptions', {}))
+        if getattr(self, 'SourcesChanged', False):
+            self.UpdateOffsets()
+            self.SourcesChanged = False
+        b = self.BuildRightHandSide()
+        dG = self.G[self.Live] - self.FactorG
+        changed = np.nonzero(dG)[0]
+        if maxUpdates is None:
+            maxUpdates = max(16, len(b) // 10)
+        if len(changed) > maxUpdates:
+            return self.SolveCircuit('direct', **getattr(self, 'SolverOptions', {}))
+        y = cho_solve(self.Factor, b)
+        if len(changed) > 0:
+            # A' = A + K diag(dG) K^T, with K the signed incidence of the changed resistors on the unknowns
+            K = np.zeros((len(b), len(changed)))
+            cols = np.arange(len(changed))
+            up, uq = self.LiveStart[changed], self.LiveEnd[changed]
+            K[up[up >= 0], cols[up >= 0]] = 1.0
+            K[uq[uq >= 0], cols[uq >= 0]] = -1.0
+            Z = cho_solve(self.Factor, K)
+            C = np.diag(1.0 / dG[changed]) + K.T @ Z
+            y = y - Z @ np.linalg.solve(C, K.T @ y)
+        self.SolverInfo['updates'] = len(changed)
+        self.Solution = y
+        return self.SetCurrents(y)
+
+    def GetPreconditioner(self, A, precond):
+        """
+        Builds a preconditioner for conjugate gradient on the sparse conductance matrix.
+        :param A: sparse conductance matrix (csr)
+        :param precond: 'amg', 'ilu', 'jacobi' or None
+        :return: a LinearOperator approximating the inverse of A, or None
+        """
+        if precond is None:
+            return None
+        if precond == 'amg':
+            try:
+                import pyamg
+            except ImportError:
+                raise ImportError("precond='amg' requires the pyamg package")
+            return pyamg.smoothed_aggregation_solver(A).aspreconditioner(cycle='V')
+        if precond == 'ilu':
+            # scipy has no incomplete Cholesky; ILU with a symmetric ordering and no pivoting plays the same role here
+            ilu = spilu(A.tocsc(), drop_tol=1e-4, fill_factor=10, permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.0)
+            return LinearOperator(A.shape, ilu.solve)
+        if precond == 'jacobi':
+            d = 1.0 / A.diagonal()
+            return LinearOperator(A.shape, lambda x: d * x)
+        raise ValueError("Unknown preconditioner '{}'".format(precond))
+
+    def AnalyzeCircuit(self, method='direct', **kwargs):
+        """
+        Solves for the currents in every resistor of the network and prints them.
+        Positive current flows from the first node in the resistor name to the second.
+        :param method: 'direct' or 'cg', see SolveCircuit
+        :param kwargs: extra options for SolveCircuit
+        :return: an array of resistor currents in the order of self.Resistors
+        """
+        i = self.SolveCircuit(method, **kwargs)
+        for r in self.Resistors:
+            print("I_{} = {:0.1f}".format(r.Name, r.Current))
+        if method == 'cg':
+            print("CG: {} iterations, relative residual {:0.2e}".format(self.SolverInfo['iterations'], self.SolverInfo['residual']))
         return i
 
-    def GetKirchoffVals(self, i):
-        """
-        This function uses Kirchoff Voltage and Current laws to analyze this specific circuit
-        KVL:  The net voltage drop for a closed loop in a circuit should be zero
-        KCL:  The net current flow into a node in a circuit should be zero
-        :param i: a list of currents relevant to the circuit
-        :return: a list of loop voltage drops and node currents
-        """
-        # set current in resistors in the top loop.
-        self.GetResistorByName('ad').Current = i[0] #I_1 in diagram
-        self.GetResistorByName('bc').Current = i[0] #I_1 in diagram
-        self.GetResistorByName('cd').Current = i[2] #I_3 in diagram
-        #current in resistor in bottom of loop
-        self.GetResistorByName('ce').Current = i[1] #I_2 in diagram
-        Node_c_Current = sum([i[0], i[1], -i[2]]) #net current node c
-        KVL = self.GetLoopVoltageDrops()  #calls 2 equations
-        KVL.append(Node_c_Current) #calls one equation to append to Kirchoff vals
-        return KVL
+    def MonteCarlo(self, nSamples=1000, RTol=None, VTol=0.0, R=None, E=None, seed=None,
+                   percentiles=(1, 5, 50, 95, 99), chunk=1000):
+        """
+        Tolerance analysis: solves the network for many draws of the resistances and source voltages at once.
+        The topology is fixed, so the samples share one incidence structure and are solved as a stack of dense
+        linear systems with np.linalg.solve, a chunk of samples at a time.  No Resistor objects are created or
+        changed and nothing is printed.
+        :param nSamples: number of draws when R and E are not given
+        :param RTol: resistances are drawn uniformly within +/- RTol of nominal (e.g., 0.05 for 5%); default 0.05,
+                     or 0 (nominal resistances) when E is given
+        :param VTol: source voltages are drawn uniformly within +/- VTol of nominal
+        :param R: optional 2-D array (nSamples, len(self.Resistors)) of resistance samples, overrides RTol
+        :param E: optional 2-D array (nSamples, len(self.VSources)) of source voltage samples, overrides VTol
+        :param seed: seed for the random draws
+        :param percentiles: percentiles of each current to report
+        :param chunk: number of samples solved per stacked solve
+        :return: a dictionary with 'nominal', 'currents' (nSamples, nResistors), 'mean', 'std', 'min', 'max',
+                 'percentiles' {p: array}, 'worst' (largest deviation from nominal, signed) and 'worstSample' (its index)
+        """
+        nominal = self.SolveCircuit()
+        rng = np.random.default_rng(seed)
+        given = [(name, np.asarray(a, dtype=float), n) for name, a, n in (('R', R, len(self.R)), ('E', E, len(self.E)))
+                 if a is not None]
+        for name, a, n in given:
+            if a.ndim != 2 or a.shape[1] != n:
+                raise ValueError("{} must be a 2-D array of shape (nSamples, {}), not {}".format(name, n, a.shape))
+        if given:
+            nSamples = given[0][1].shape[0]
+            if any(a.shape[0] != nSamples for name, a, n in given):
+                raise ValueError("R and E must have the same number of samples")
+        if RTol is None:
+            RTol = 0.0 if E is not None else 0.05
+        R = self.R * (1.0 + RTol * rng.uniform(-1.0, 1.0, (nSamples, len(self.R)))) if R is None else \
+            np.asarray(R, dtype=float)
+        E = self.E * (1.0 + VTol * rng.uniform(-1.0, 1.0, (nSamples, len(self.E)))) if E is None else \
+            np.asarray(E, dtype=float)
+
+        # node offsets are linear in the source voltages: offsets = E @ T.T
+        T = np.zeros((len(self.NodeIndex), len(self.E) + len(self.L)))  # inductor columns stay at 0V
+        for b, a, k, sign in self.SourceTree:
+            T[b] = T[a]
+            T[b, k] += sign
+        T = T[:, :len(self.E)]
+        # signed incidence of the resistors between supernodes on the unknowns
+        nU = int(self.Unknown.max()) + 1 if len(self.Unknown) else 0
+        cols = np.arange(len(self.LiveStart))
+        K = np.zeros((nU, len(cols)))
+        K[self.LiveStart[self.LiveStart >= 0], cols[self.LiveStart >= 0]] = 1.0
+        K[self.LiveEnd[self.LiveEnd >= 0], cols[self.LiveEnd >= 0]] = -1.0
+
+        currents = np.empty((nSamples, len(self.R)))
+        chunk = max(1, min(chunk, int(2e8 // (8 * nU * nU + 1))))  # keep each stack of matrices to ~200 MB
+        for c0 in range(0, nSamples, chunk):
+            c = slice(c0, min(c0 + chunk, nSamples))
+            g = 1.0 / R[c]
+            off = E[c] @ T.T
+            gl = g[:, self.Live]
+            ig = gl * (off[:, self.RStart] - off[:, self.REnd])[:, self.Live]
+            u = np.zeros((g.shape[0], nU))
+            if nU > 0:
+                A = (K[None, :, :] * gl[:, None, :]) @ K.T
+                u = np.linalg.solve(A, (-ig @ K.T)[:, :, None])[:, :, 0]
+            U = np.concatenate((u, np.zeros((g.shape[0], 1))), axis=1)[:, self.Unknown]
+            V = U[:, self.SuperNode] + off
+            currents[c] = g * (V[:, self.RStart] - V[:, self.REnd])
+
+        dev = currents - nominal
+        worstSample = np.argmax(np.abs(dev), axis=0)
+        cols = np.arange(len(self.R))
+        return {'nominal': nominal, 'currents': currents,
+                'mean': currents.mean(axis=0), 'std': currents.std(axis=0),
+                'min': currents.min(axis=0), 'max': currents.max(axis=0),
+                'percentiles': {p: np.percentile(currents, p, axis=0) for p in percentiles},
+                'worst': dev[worstSample, cols], 'worstSample': worstSample}
+
+    def FrequencySweep(self, freqs, chunk=256):
+        """
+        AC analysis over many frequencies at once.  Source values are taken as phasor amplitudes (zero phase).
+        Each branch admittance is a + j*w*c + d/(j*w) (resistors 1/R, capacitors C, inductors 1/L), so the nodal
+        matrix is Y(w) = Y0 + j*w*Y1 + Y2/(j*w) with Y0, Y1, Y2 assembled once from the topology.  The complex
+        systems for a chunk of frequencies are stacked and solved with one batched np.linalg.solve call.
+        Nothing is printed and the DC results on the element objects are not changed.
+        :param freqs: array of frequencies in Hz (all > 0)
+        :param chunk: number of frequencies solved per stacked solve
+        :return: a dictionary with 'freq', 'nodes' (names), node voltages 'V' (nFreq, nNodes), branch currents
+                 'IR', 'IC', 'IL' and source currents 'IS' (first node to second node through the source), and the
+                 impedance seen by each source 'Zin' = E/IS, all complex arrays with one row per frequency
+        """
+        freqs = np.atleast_1d(np.asarray(freqs, dtype=float))
+        if np.any(freqs <= 0):
+            raise ValueError("Frequencies must be positive")
+        self.CompileNetlist()
+        nN = len(self.NodeIndex)
+        superNode, offset, tree, nS = self.MergeSuperNodes(self.SStart, self.SEnd, self.E)
+        start = np.concatenate((self.RStart, self.CStart, self.LStart))
+        end = np.concatenate((self.REnd, self.CEnd, self.LEnd))
+        nR, nC, nL = len(self.R), len(self.C), len(self.L)
+        y0 = np.concatenate((1.0 / self.R, np.zeros(nC + nL)))
+        y1 = np.concatenate((np.zeros(nR), self.C, np.zeros(nL)))
+        y2 = np.concatenate((np.zeros(nR + nC), 1.0 / self.L))
+        p, q = superNode[start], superNode[end]
+        live = p != q
+        unknown = self.GroundSuperNodes(p[live], q[live], nS)
+        n = int(unknown.max()) + 1 if nS else 0
+        up, uq = unknown[p[live]], unknown[q[live]]
+        dOff = (offset[start] - offset[end])[live]
+
+        def stamp(y):
+            # conductance-like matrix and source driven right hand side for one admittance coefficient
+            y = y[live]
+            Y = np.zeros((n, n))
+            for r, c, sign in ((up, up, 1), (uq, uq, 1), (up, uq, -1), (uq, up, -1)):
+                ok = (r >= 0) & (c >= 0)
+                np.add.at(Y, (r[ok], c[ok]), sign * y[ok])
+            b = np.zeros(n)
+            np.add.at(b, up[up >= 0], -(y * dOff)[up >= 0])
+            np.add.at(b, uq[uq >= 0], (y * dOff)[uq >= 0])
+            return Y, b
+
+        (Y0, b0), (Y1, b1), (Y2, b2) = stamp(y0), stamp(y1), stamp(y2)
+        V = np.empty((len(freqs), nN), dtype=complex)
+        for c0 in range(0, len(freqs), chunk):
+            jw = 2j * np.pi * freqs[c0:c0 + chunk]
+            u = np.zeros((len(jw), n), dtype=complex)
+            if n > 0:
+                Y = Y0 + jw[:, None, None] * Y1 + Y2 / jw[:, None, None]
+                b = b0 + jw[:, None] * b1 + b2 / jw[:, None]
+                u = np.linalg.solve(Y, b[:, :, None])[:, :, 0]
+            U = np.concatenate((u, np.zeros((len(jw), 1))), axis=1)[:, unknown]
+            V[c0:c0 + chunk] = U[:, superNode] + offset
+
+        jw = 2j * np.pi * freqs[:, None]
+        I = (y0 + jw * y1 + y2 / jw) * (V[:, start] - V[:, end])
+        # current each node sends into the passive branches, which the sources must supply
+        out = np.zeros((len(freqs), nN), dtype=complex)
+        np.add.at(out.T, start, I.T)
+        np.add.at(out.T, end, -I.T)
+        IS = np.zeros((len(freqs), len(self.E)), dtype=complex)
+        for b, a, k, sign in reversed(tree):
+            IS[:, k] = sign * out[:, b]
+            out[:, a] += out[:, b]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Zin = self.E / IS
+        return {'freq': freqs, 'nodes': sorted(self.NodeIndex, key=self.NodeIndex.get), 'V': V,
+                'IR': I[:, :nR], 'IC': I[:, nR:nR + nC], 'IL': I[:, nR + nC:], 'IS': IS, 'Zin': Zin}
 
     def GetElementDeltaV(self, name):
         """
         Need to retrieve either a resistor or a voltage source by name.
-        :param name:
-        :return:
+        :param name: element name in the direction of traversal (e.g., 'da' traverses resistor 'ad' backwards)
+        :return: the voltage change across the element in the direction of traversal
         """
-        for r in self.Resistors:
-            if name == r.Name or name[::-1] == r.Name:
-                return -r.DeltaV()
-        for v in self.VSources:
-            if name == v.Name:
-                return v.Voltage
-            if name[::-1] == v.Name:
-                return -v.Voltage
+        if not hasattr(self, 'EdgeIndex'):
+            self.CompileNetlist()
+        a, b = (self.NodeIndex[n] for n in self.GetElementNodes(name))
+        k, sign = self.EdgeIndex[(a, b)]
+        return sign * self.GetElementVoltageRises()[k]
+
+    def GetElementVoltageRises(self):
+        """
+        Voltage change across every element when traversed from its first node to its second node.
+        Resistors drop I*R in the direction of the current and sources rise by their value.
+        :return: an array with resistors first, then sources
+        """
+        return np.concatenate((-self.I * self.R, self.E))
 
-    def GetLoopVoltageDrops(self):
+    def GetLoopVoltageDrops(self, i=None):
         """
         This calculates the net voltage drop around a closed loop in a circuit based on the
-        current flowing through resistors (cause a drop in voltage regardless of direction of traversal) or
+        current flowing through resistors (a drop in voltage in the direction of the current) or
         the value of the voltage source that have been set up as positive based on the direction of traversal.
+        All loops are summed at once with the signed loop-element incidence matrix.  If there are no loops, an
+        independent set is found from the topology first (see FindLoops).
+        :param i: optional array of resistor currents to evaluate, otherwise the currents from the last solve are used
         :return: net voltage drop for all loops in the network.
         """
-        loopVoltages = []
-        for L in self.Loops:
-            # Traverse loops in order of nodes and add up voltage drops between nodes
-            loopDeltaV = 0
-            for n in range(len(L.Nodes)):
-                name = L.Nodes[0] + L.Nodes[n] if n == len(L.Nodes) - 1 else L.Nodes[n] + L.Nodes[n + 1]
-                loopDeltaV += self.GetElementDeltaV(name)
-            loopVoltages.append(loopDeltaV)
-        return loopVoltages
+        if len(self.Loops) == 0:
+            self.FindLoops()  # no loops given, so derive an independent set from the topology
+        if not hasattr(self, 'EdgeIndex'):
+            self.CompileNetlist()
+        if self.LoopMatrix is None or self.LoopMatrix.shape[0] != len(self.Loops):
+            self.LoopMatrix = self.BuildLoopMatrix()
+        if i is not None:
+            self.I = np.asarray(i, dtype=float)
+        return list(self.LoopMatrix @ self.GetElementVoltageRises())
+
+    def FindLoops(self):
+        """
+        Replaces self.Loops with a minimal set of independent loops found from the element topology.
+        A breadth first spanning tree is grown over the nodes, and every element not in the tree closes exactly
+        one loop through the tree.  This gives (elements - nodes + connected parts) loops, which keeps the KVL
+        equations independent, and the breadth first tree keeps the loops short.
+        :return: the list of loops
+        """
+        elements = self.Resistors + self.VSources
+        nodes = self.GetNodeNames()
+        index = {n: k for k, n in enumerate(nodes)}
+        ends = [tuple(index[n] for n in self.GetElementNodes(e.Name)) for e in elements]
+        self.Loops = []
+        for cNodes, cEdges in self.GetCycleBasis(len(nodes), ends):
+            L = Loop()
+            L.Name = 'L{}'.format(len(self.Loops) + 1)
+            L.Nodes = [nodes[n] for n in cNodes]
+            L.Elements = [elements[k] for k in cEdges]
+            self.Loops.append(L)
+        self.CompileNetlist()
+        return self.Loops
+
+    def GetCycleBasis(self, nNodes, ends):
+        """
+        Finds the fundamental cycles of a graph with respect to a breadth first spanning forest.  Each cycle
+        starts at the first end of the edge that closes it.  P2's PipeNetwork.getCycleBasis is the same
+        routine, copied on purpose because the two projects do not share code.
+        :param nNodes: number of nodes
+        :param ends: list of (node index, node index) for each edge
+        :return: a list of cycles, each a tuple of (node indices in traversal order, edge indices in traversal order)
+        """
+        adj = [[] for n in range(nNodes)]
+        for k, (a, b) in enumerate(ends):
+            adj[a].append((b, k))
+            adj[b].append((a, k))
+        depth = [-1] * nNodes
+        parent = [-1] * nNodes
+        parentEdge = [-1] * nNodes
+        inTree = [False] * len(ends)
+        for root in range(nNodes):
+            if depth[root] >= 0:
+                continue
+            depth[root] = 0
+            queue = deque([root])
+            while queue:
+                a = queue.popleft()
+                for b, k in adj[a]:
+                    if depth[b] < 0:
+                        depth[b] = depth[a] + 1
+                        parent[b] = a
+                        parentEdge[b] = k
+                        inTree[k] = True
+                        queue.append(b)
+        cycles = []
+        for k, (u, v) in enumerate(ends):
+            if inTree[k] or u == v:
+                continue
+            # climb from both ends of the chord to their common ancestor
+            a, b = u, v
+            pathA, pathB, edgesA, edgesB = [u], [v], [], []
+            while a != b:
+                if depth[a] >= depth[b]:
+                    edgesA.append(parentEdge[a])
+                    a = parent[a]
+                    pathA.append(a)
+                else:
+                    edgesB.append(parentEdge[b])
+                    b = parent[b]
+                    pathB.append(b)
+            # u -> v across the chord, up from v to the ancestor, then back down to u
+            cycles.append(([u] + pathB[:-1] + pathA[:0:-1], [k] + edgesB + edgesA[::-1]))
+        return cycles
 
     def GetResistorByName(self, name):
         """
         A way to retrieve a resistor object from self.Resistors based on resistor name
-        :param name:
-        :return:
+        :param name: resistor name
+        :return: the Resistor object, or None if there is no such resistor
         """
-        for r in self.Resistors:
-            if r.Name == name:
-                return r
+        if not hasattr(self, 'ResistorIndex') or len(self.ResistorIndex) != len(self.Resistors):
+            self.CompileNetlist()
+        k = self.ResistorIndex.get(name)
+        return None if k is None else self.Resistors[k]
     #endregion
 
 class ResistorNetwork_2(ResistorNetwork):
     def __init__(self):
+        """
+        Kept so existing scripts still run.  The general solver in ResistorNetwork handles the extra
+        resistor in parallel with the 32V source without any special treatment.
+        """
         super().__init__() #runs constructor of parent class
         #endregion
     #endregion
-
-    def AnalyzeCircuit(self):
-        """
-        repeat of analyze circuit but for network 2
-        as this is embedded in Network 2 class.
-        fsolve for all currents in network 2
-        """
-        i0 = [0, 0, 0, 0]  # Additional current for the extra resistor
-        i = fsolve(self.GetKirchoffVals, i0)
-        print("I1 = {:0.1f}".format(i[0])) #I1 in diagram printed output
-        print("I2 = {:0.1f}".format(i[1])) #I2 in diagram
-        print("I3 = {:0.1f}".format(i[2])) #I3 in diagram
-        print("I4 = {:0.1f}".format(i[3])) #I4 in diagram
-        return i #fsolved KVL for each I
-
-    def GetKirchoffVals(self, i):
-        """
-        This function uses Kirchoff Voltage and Current laws to analyze this specific circuit
-        of resistor network 2
-        KVL:  The net voltage drop for a closed loop in a circuit should be zero
-        KCL:  The net current flow into a node in a circuit should be zero
-        :param i: a list of currents relevant to the circuit
-        :return: a list of loop voltage drops and node currents
-        """
-        self.GetResistorByName('ad').Current = i[0] #I_1 in diagram
-        self.GetResistorByName('bc').Current = i[0] #I_1 in diagram
-        self.GetResistorByName('cd').Current = i[2] #I_2 in diagram
-        self.GetResistorByName('ce').Current = i[1] #I_3 in diagram
-        self.GetResistorByName('de').Current = i[3]  #I_4 in diagram added in parallel
-        Node_c_Current = sum([i[0], i[1], -i[2]]) #net current @ c
-        Node_e_Current = sum([-i[3], i[2]])  #Kirchhoff equation node e
-        KVL = self.GetLoopVoltageDrops() #2 equations
-        KVL.append(Node_c_Current)
-        KVL.append(Node_e_Current)
-        return [KVL[0], KVL[1], Node_c_Current, Node_e_Current]
-
-    #endregion
 #endregion
\ No newline at end of file
@@ -0,0 +1,56 @@
+#region imports
+import warnings
+import numpy as np
+#endregion
+
+class DesignEvaluator():
+    #region constructor
+    def __init__(self, network, pipes, diameters, minHead, friction, tol, maxiter):
+        '''
+        Solves pipe diameter designs of one network for DiameterOptimizer.  Each process that evaluates designs
+        has its own evaluator: the optimizer keeps one for solves in its own process, and each pool worker
+        builds one when it starts, so the network and the settings are sent once per process rather than once
+        per design.  Every solve is warm started from the last one.
+        :param network: a PipeNetwork with its nodes, external flows and reservoirs set
+        :param pipes: indices of the sized pipes
+        :param diameters: catalogue diameters in mm
+        :param minHead: minimum head in m of every node (-inf where unconstrained)
+        :param friction: turbulent friction factor method or FrictionTable, see PipeNetwork.ggaFlowRates
+        :param tol: convergence tolerance of each solve
+        :param maxiter: iteration limit of each solve
+        '''
+        #region attributes
+        network.compileNetwork()
+        self.network = network
+        self.pipes = pipes
+        self.diameters = diameters
+        self.minHead = minHead
+        self.friction = friction
+        self.tol = tol
+        self.maxiter = maxiter
+        self.Q0 = network.Q.copy()  # flows and heads to restart from after a failed solve
+        self.H0 = np.array([n.head for n in network.nodes], dtype=float)
+        #endregion
+    #endregion
+
+    #region methods
+    def evaluate(self, design):
+        '''
+        Solves the network for one design.  Only the compiled diameters change, so the network is not
+        recompiled.
+        :param design: array of catalogue indices, one per sized pipe
+        :return: total head deficit below the minimum heads in m (inf if the solve failed)
+        '''
+        net = self.network
+        net.D[self.pipes] = self.diameters[design] / 1000.0
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            net.ggaFlowRates(tol=self.tol, maxiter=self.maxiter, friction=self.friction, compile=False)
+        if not net.solverReport['converged']:
+            # do not warm start the next design from a failed solve
+            net.setFlowRates(self.Q0)
+            for n, h in zip(net.nodes, self.H0.tolist()):
+                n.head = h
+            return np.inf
+        return float(np.sum(np.maximum(self.minHead - net.H, 0.0)))
+    #endregion
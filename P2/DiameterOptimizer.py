@@ -0,0 +1,263 @@
+#region imports
+import os
+import warnings
+from multiprocessing import Pool
+import numpy as np
+from DesignEvaluator import DesignEvaluator
+#endregion
+
+class DiameterOptimizer():
+    #region constructor
+    def __init__(self, network, catalogue, minHead=20.0, pipes=None, penalty=None, processes=None, seed=None,
+                 friction='colebrook', tol=1e-6, maxiter=50):
+        '''
+        Chooses pipe diameters from a commercial catalogue so that every junction keeps a minimum head at the
+        least pipe cost.  A design is one catalogue index per sized pipe; it costs sum(length*unit cost) and is
+        feasible if no junction head is below its minimum.  Designs are evaluated with the GGA solver
+        (PipeNetwork.ggaFlowRates), so the network needs at least one reservoir (Node.fixedHead) to give heads
+        a datum.
+        Evaluations run across a process pool.  Each worker keeps its copy of the network in a DesignEvaluator and
+        warm starts every solve from the last one, and batches are sorted so that similar designs go to the same
+        worker.  Every evaluated design is cached, so the search never solves the same design twice.
+        :param network: a PipeNetwork with its nodes, external flows and reservoirs set
+        :param catalogue: list of (diameter in mm, cost per m) pairs
+        :param minHead: minimum head in m at every junction, or a dictionary of node name -> minimum head for
+                        the nodes that are constrained
+        :param pipes: names of the pipes to size (default all)
+        :param penalty: cost per m of total head deficit added to an infeasible design's cost (default: the cost
+                        of the largest design per m, so any deficit outweighs any saving)
+        :param processes: number of worker processes (default os.cpu_count(), 1 solves in this process)
+        :param seed: seed for the genetic search
+        :param friction: turbulent friction factor method or FrictionTable, see PipeNetwork.ggaFlowRates
+        :param tol: convergence tolerance of each solve
+        :param maxiter: iteration limit of each solve
+        '''
+        #region attributes
+        self.network = network
+        network.compileNetwork()
+        catalogue = sorted(catalogue)
+        self.diameters = np.array([c[0] for c in catalogue], dtype=float)  # mm
+        self.unitCost = np.array([c[1] for c in catalogue], dtype=float)  # per m
+        names = [p.Name() for p in network.pipes] if pipes is None else list(pipes)
+        self.pipes = np.array([network.pipeIndex[n] for n in names], dtype=np.intp)  # sized pipe indices
+        self.length = network.L[self.pipes]
+        self.minHead = np.full(len(network.nodes), -np.inf)
+        if isinstance(minHead, dict):
+            for n, h in minHead.items():
+                self.minHead[network.nodeIndex[n]] = h
+        else:
+            self.minHead[:] = minHead
+        self.minHead[~np.isnan(network.fixedHead)] = -np.inf  # reservoirs hold their own head
+        if np.all(np.isnan(network.fixedHead)):
+            raise ValueError("The network needs a reservoir (a node with a fixedHead) to design for heads")
+        self.penalty = self.getCost(np.full(len(self.pipes), len(self.diameters) - 1)) if penalty is None \
+            else penalty
+        self.processes = processes
+        self.rng = np.random.default_rng(seed)
+        self.friction = friction
+        self.tol = tol
+        self.maxiter = maxiter
+        self.cache = {}  # design bytes -> total head deficit in m (inf if the solve failed)
+        self.evaluations = 0  # designs solved
+        self.cacheHits = 0  # designs found in the cache
+        self.pool = None
+        self.evaluator = None  # DesignEvaluator for solves in this process, built on first use
+        #endregion
+    #endregion
+
+    #region methods
+    def getSettings(self):
+        '''
+        :return: the arguments of a DesignEvaluator for this optimizer
+        '''
+        return (self.network, self.pipes, self.diameters, self.minHead, self.friction, self.tol, self.maxiter)
+
+    def getCost(self, design):
+        '''
+        :param design: array of catalogue indices, one per sized pipe
+        :return: pipe cost of the design
+        '''
+        return float(self.length @ self.unitCost[design])
+
+    def getFitness(self, design, deficit):
+        '''
+        :param design: array of catalogue indices
+        :param deficit: total head deficit of the design in m
+        :return: cost plus penalty*deficit (inf if the design could not be solved)
+        '''
+        return self.getCost(design) + self.penalty * deficit if np.isfinite(deficit) else np.inf
+
+    def evaluate(self, designs):
+        '''
+        Total head deficits of a batch of designs.  Cached designs are looked up, and the rest are sorted so
+        neighbouring designs are alike and solved across the pool.
+        :param designs: 2-D array, one design per row
+        :return: array of total head deficits in m, one per design (0 means feasible)
+        '''
+        designs = np.atleast_2d(np.asarray(designs, dtype=np.intp))
+        keys = [d.tobytes() for d in designs]
+        new = {}
+        for k, d in zip(keys, designs):
+            if k in self.cache:
+                self.cacheHits += 1
+            elif k not in new:
+                new[k] = d
+        if len(new) > 0:
+            batch = np.array(list(new.values()))
+            order = np.lexsort(batch.T[::-1])  # sort the designs so that similar ones are neighbours
+            batch = batch[order]
+            if self.pool is None:
+                if self.evaluator is None:
+                    self.evaluator = DesignEvaluator(*self.getSettings())
+                deficits = [self.evaluator.evaluate(d) for d in batch]
+            else:
+                workers = self.processes or os.cpu_count()
+                deficits = self.pool.map(evaluateDesign, batch, chunksize=max(1, len(batch) // (2 * workers)))
+            for d, deficit in zip(batch, deficits):
+                self.cache[d.tobytes()] = deficit
+            self.evaluations += len(batch)
+        return np.array([self.cache[k] for k in keys])
+
+    def optimize(self, method='greedy', localSearch=True, **kwargs):
+        '''
+        Searches for the least cost feasible design and applies it to the network's pipes, which are left at its
+        solution.
+        :param method: 'greedy' (see greedyDesign) or 'genetic' (see geneticDesign)
+        :param localSearch: polish the design found with localSearch
+        :param kwargs: options of geneticDesign
+        :return: a dictionary with 'design' (catalogue indices), 'diameters' {pipe name: mm}, 'cost',
+                 'deficit', 'feasible', 'evaluations' and 'cacheHits'
+        '''
+        if method not in ('greedy', 'genetic'):
+            raise ValueError("Unknown method '{}'".format(method))
+        try:
+            if self.processes != 1:
+                self.pool = Pool(self.processes, initializer=setPoolEvaluator, initargs=self.getSettings())
+            design = self.greedyDesign() if method == 'greedy' else self.geneticDesign(**kwargs)
+            if localSearch:
+                design = self.localSearch(design)
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+        deficit = float(self.evaluate(design)[0])
+        self.applyDesign(design)
+        return {'design': design, 'diameters': {self.network.pipes[k].Name(): float(D) for k, D in
+                                                zip(self.pipes, self.diameters[design])},
+                'cost': self.getCost(design), 'deficit': deficit, 'feasible': deficit == 0.0,
+                'evaluations': self.evaluations, 'cacheHits': self.cacheHits}
+
+    def applyDesign(self, design):
+        '''
+        Sets the diameters of the sized pipes to a design and solves the network with them.
+        :param design: array of catalogue indices
+        :return: nothing
+        '''
+        for k, D in zip(self.pipes, self.diameters[design]):
+            self.network.pipes[k].d = D / 1000.0
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.network.ggaFlowRates(tol=self.tol, maxiter=self.maxiter, friction=self.friction)
+
+    def greedyDesign(self):
+        '''
+        Starts from the largest diameter everywhere and, each round, takes the one step downsize of a single
+        pipe that saves the most while staying feasible, until no downsize is feasible.  The downsizes of a round
+        are evaluated as one batch.
+        :return: array of catalogue indices
+        '''
+        design = np.full(len(self.pipes), len(self.diameters) - 1)
+        if self.evaluate(design)[0] > 0:
+            warnings.warn("The largest diameters do not meet the minimum heads")
+            return design
+        while True:
+            movable = np.flatnonzero(design > 0)
+            if len(movable) == 0:
+                return design
+            candidates = np.tile(design, (len(movable), 1))
+            candidates[np.arange(len(movable)), movable] -= 1
+            deficit = self.evaluate(candidates)
+            if not np.any(deficit == 0):
+                return design
+            saving = self.length[movable] * (self.unitCost[design[movable]] - self.unitCost[design[movable] - 1])
+            design = candidates[np.argmax(np.where(deficit == 0, saving, -np.inf))]
+
+    def localSearch(self, design):
+        '''
+        Improves a design by best improvement over its neighbourhood: every one step downsize of one pipe, and
+        every one step downsize of one pipe paired with a one step upsize of another that lowers the cost.  The
+        neighbourhood of a design with n sized pipes has up to n^2 designs, evaluated as one batch.  Moves are
+        taken while one improves the fitness.
+        :param design: array of catalogue indices
+        :return: the improved design
+        '''
+        n, top = len(self.pipes), len(self.diameters) - 1
+        design = np.array(design, dtype=np.intp)
+        best = self.getFitness(design, self.evaluate(design)[0])
+        while True:
+            moves = [(i, j) for i in range(n) if design[i] > 0 for j in [None] + list(range(n))
+                     if j is None or (j != i and design[j] < top)]
+            candidates = np.tile(design, (len(moves), 1))
+            for row, (i, j) in enumerate(moves):
+                candidates[row, i] -= 1
+                if j is not None:
+                    candidates[row, j] += 1
+            cost = self.length @ self.unitCost[candidates].T if len(moves) else np.zeros(0)
+            candidates = candidates[cost < self.getCost(design)]  # only moves that save can improve
+            if len(candidates) == 0:
+                return design
+            fitness = np.array([self.getFitness(c, d) for c, d in zip(candidates, self.evaluate(candidates))])
+            k = int(np.argmin(fitness))
+            if fitness[k] >= best:
+                return design
+            design, best = candidates[k], fitness[k]
+
+    def geneticDesign(self, popSize=40, generations=50, mutation=None, elite=2):
+        '''
+        Genetic search with tournament selection, uniform crossover, mutation by one catalogue step and
+        elitism, on the penalized cost.  Each generation is evaluated as one batch.  The first population is
+        random designs plus the largest design.
+        :param popSize: designs per generation
+        :param generations: number of generations
+        :param mutation: probability of mutating each gene (default 1/number of sized pipes)
+        :param elite: number of best designs carried over unchanged
+        :return: the best design found
+        '''
+        n, top = len(self.pipes), len(self.diameters) - 1
+        mutation = 1.0 / n if mutation is None else mutation
+        pop = self.rng.integers(0, top + 1, size=(popSize, n))
+        pop[0] = top
+        for g in range(generations + 1):
+            fitness = np.array([self.getFitness(d, deficit) for d, deficit in zip(pop, self.evaluate(pop))])
+            order = np.argsort(fitness)
+            pop, fitness = pop[order], fitness[order]
+            if g == generations:
+                return pop[0]
+            # tournaments of two pick the parents
+            a, b = self.rng.integers(0, popSize, size=(2, 2 * (popSize - elite)))
+            parents = pop[np.minimum(a, b)]  # the population is sorted, so the lower index is the fitter
+            mothers, fathers = parents[0::2], parents[1::2]
+            children = np.where(self.rng.random(mothers.shape) < 0.5, mothers, fathers)
+            step = self.rng.choice([-1, 1], size=children.shape) * (self.rng.random(children.shape) < mutation)
+            children = np.clip(children + step, 0, top)
+            pop = np.vstack((pop[:elite], children))
+    #endregion
+
+#region function definitions
+poolEvaluator = []  # the DesignEvaluator of a pool worker process; a pool serves a single optimizer
+
+def setPoolEvaluator(*settings):
+    '''
+    Pool initializer for DiameterOptimizer: builds the worker's DesignEvaluator from the optimizer's settings.
+    '''
+    poolEvaluator[:] = [DesignEvaluator(*settings)]
+
+def evaluateDesign(design):
+    '''
+    Solves one design with the pool worker's DesignEvaluator.
+    :param design: array of catalogue indices, one per sized pipe
+    :return: total head deficit below the minimum heads in m (inf if the solve failed)
+    '''
+    return poolEvaluator[0].evaluate(design)
+#endregion
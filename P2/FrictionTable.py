@@ -0,0 +1,213 @@
+#region imports
+import os
+import numpy as np
+from FrictionFactor import frictionFactor
+#endregion
+
+class FrictionTable():
+    #region constructor
+    def __init__(self, tol=1e-3, kind='linear', method='colebrook', transition='smooth', ReRange=(1.0, 1e8),
+                 rrRange=(1e-8, 0.05), filename=None):
+        '''
+        A precomputed friction factor lookup over a log-spaced grid of Reynolds number and relative roughness,
+        for tight loops (Monte Carlo, design sweeps) where even the vectorized Colebrook solve costs too much.
+        log(f) is tabulated against log(Re) and log(rr) on a uniform grid whose Re spacing is a fraction of an
+        octave anchored at Re=2000, so the regime boundaries Re=2000 and Re=4000 (laminar, transition blend,
+        turbulent) fall on grid lines and their kinks are not smeared by the interpolation.  The grid is refined
+        until the interpolated f is within tol (relative) of frictionFactor between the grid points.  Laminar
+        flow is exact.
+        A lookup is index arithmetic and gathers on whole arrays: bilinear, or Catmull-Rom bicubic on a 4x4
+        stencil (linear in Re in the cells next to a regime boundary).
+        Queries outside ReRange or above the largest roughness fall back to frictionFactor; roughness below
+        the smallest tabulated value is treated as the smallest (1e-8 is hydraulically smooth).
+        :param tol: relative accuracy of the table against frictionFactor
+        :param kind: 'linear' for bilinear or 'cubic' for Catmull-Rom bicubic interpolation
+        :param method: turbulent friction factor method, see FrictionFactor.turbulentFrictionFactor
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :param ReRange: (smallest, largest) tabulated Reynolds number
+        :param rrRange: (smallest, largest) tabulated relative roughness
+        :param filename: .npz file to load the table from, or to save it to after building (None: no file)
+        '''
+        #region attributes
+        self.tol = tol
+        self.kind = kind
+        self.method = method
+        self.transition = transition
+        self.ReRange = (float(ReRange[0]), float(ReRange[1]))
+        self.rrRange = (float(rrRange[0]), float(rrRange[1]))
+        self.filename = filename
+        self.x = None  # log Re grid
+        self.y = None  # log rr grid
+        self.z = None  # log f table, with a border of ghost points for cubic lookups
+        self.breaks = np.zeros(0, dtype=np.intp)  # grid indices of Re=2000 and Re=4000
+        self.maxError = 0.0
+        #endregion
+        if kind not in ('linear', 'cubic'):
+            raise ValueError("Unknown interpolation kind '{}'".format(kind))
+        if filename is None or not self.load(filename):
+            self.build()
+            if filename is not None:
+                self.save(filename)
+    #endregion
+
+    #region methods
+    def setGrid(self, nx, ny):
+        '''
+        Makes the grid and fills the table.
+        :param nx: grid points per octave of Re
+        :param ny: grid points per decade of rr
+        :return: nothing
+        '''
+        dx = np.log(2.0) / nx
+        lo = int(np.floor((np.log(self.ReRange[0]) - np.log(2000.0)) / dx))
+        hi = int(np.ceil((np.log(self.ReRange[1]) - np.log(2000.0)) / dx))
+        self.x = np.log(2000.0) + dx * np.arange(lo, max(hi, lo + 3) + 1)
+        self.y = np.linspace(np.log(self.rrRange[0]), np.log(self.rrRange[1]),
+                             max(3, int(np.ceil(ny * np.log10(self.rrRange[1] / self.rrRange[0])))) + 1)
+        self.breaks = np.array([-lo + b for b in (0, nx) if 0 < -lo + b < len(self.x) - 1], dtype=np.intp)
+        X, Y = np.meshgrid(self.x, self.y, indexing='ij')
+        f = frictionFactor(np.exp(X).ravel(), np.exp(Y).ravel(), self.method, self.transition)[0]
+        self.setTable(np.log(f).reshape(X.shape))
+
+    def setTable(self, z):
+        '''
+        Stores the table of log f, adding the ghost points cubic lookups need.
+        :param z: log f at the grid points
+        :return: nothing
+        '''
+        self.z = np.pad(z, 1, mode='reflect', reflect_type='odd') if self.kind == 'cubic' else z  # ghost = 2*edge - next
+
+    def getTable(self):
+        '''
+        The table of log f at the grid points, without ghost points.
+        :return: 2-D array
+        '''
+        return self.z[1:-1, 1:-1] if self.kind == 'cubic' else self.z
+
+    def build(self):
+        '''
+        Fills the table, doubling the grid density along the axis with the larger error until the error at the
+        cell centres and edge mid points is below tol.
+        :return: nothing
+        '''
+        nx, ny = 4, 8  # grid points per octave of Re and per decade of rr to start with
+        while True:
+            self.setGrid(nx, ny)
+            xm, ym = (self.x[:-1] + self.x[1:]) / 2, (self.y[:-1] + self.y[1:]) / 2
+            errX = self.getGridError(xm, self.y)
+            errY = self.getGridError(self.x, ym)
+            self.maxError = max(errX, errY, self.getGridError(xm, ym))
+            if self.maxError <= self.tol or self.z.size > 4e6:
+                break
+            if errX >= errY:
+                nx *= 2
+            if errY >= errX:
+                ny *= 2
+
+    def getGridError(self, x, y):
+        '''
+        Largest relative error of the table over a grid of test points.
+        :param x: log Re test values
+        :param y: log rr test values
+        :return: max |f_table/f - 1|
+        '''
+        X, Y = np.meshgrid(x, y, indexing='ij')
+        X, Y = X.ravel(), Y.ravel()
+        f = frictionFactor(np.exp(X), np.exp(Y), self.method, self.transition)[0]
+        return float(np.max(np.abs(np.exp(self.interpolate(X, Y)[0]) / f - 1)))
+
+    def interpolate(self, x, y):
+        '''
+        Interpolates log f and its derivative with respect to log Re.
+        :param x: array of log Re values inside the grid
+        :param y: array of log rr values inside the grid
+        :return: (log f, d(log f)/d(log Re)) arrays
+        '''
+        dx, dy = self.x[1] - self.x[0], self.y[1] - self.y[0]
+        u, v = (x - self.x[0]) / dx, (y - self.y[0]) / dy
+        i = np.clip(u.astype(np.intp), 0, len(self.x) - 2)
+        j = np.clip(v.astype(np.intp), 0, len(self.y) - 2)
+        s, t = u - i, v - j
+        z, stride = self.z.ravel(), self.z.shape[1]
+        if self.kind == 'linear':
+            base = i * stride + j  # flat index of grid point (i, j)
+            z00, z01, z10, z11 = z[base], z[base + 1], z[base + stride], z[base + stride + 1]
+            zt0, zt1 = z00 + t * (z01 - z00), z10 + t * (z11 - z10)  # along rr first, then along Re
+            return zt0 + s * (zt1 - zt0), (zt1 - zt0) / dx
+        base = (i + 1) * stride + j + 1  # skip the ghost border
+        # Catmull-Rom weights of the stencil points at offsets -1, 0, 1, 2, and their slopes in s.  The Re
+        # stencil must not reach across a regime boundary, so cells that touch one are linear in Re.
+        wy = [((-t + 2) * t - 1) * t / 2, ((3 * t - 5) * t * t + 2) / 2, ((-3 * t + 4) * t + 1) * t / 2, (t - 1) * t * t / 2]
+        wx = [((-s + 2) * s - 1) * s / 2, ((3 * s - 5) * s * s + 2) / 2, ((-3 * s + 4) * s + 1) * s / 2, (s - 1) * s * s / 2]
+        dwx = [((-3 * s + 4) * s - 1) / 2, (9 * s - 10) * s / 2, ((-9 * s + 8) * s + 1) / 2, (3 * s - 2) * s / 2]
+        kink = np.isin(i, self.breaks) | np.isin(i + 1, self.breaks)
+        if np.any(kink):
+            one = np.ones_like(s)
+            for w, linear in zip((wx, dwx), ([0 * s, 1 - s, s, 0 * s], [0 * s, -one, one, 0 * s])):
+                for a in range(4):
+                    w[a] = np.where(kink, linear[a], w[a])
+        f, dfds = np.zeros_like(x), np.zeros_like(x)
+        for a in range(4):
+            row = base + (a - 1) * stride
+            zr = wy[0] * z[row - 1] + wy[1] * z[row] + wy[2] * z[row + 1] + wy[3] * z[row + 2]
+            f += wx[a] * zr
+            dfds += dwx[a] * zr
+        return f, dfds / dx
+
+    def frictionFactor(self, Re, rr):
+        '''
+        Looks up the friction factor and its slope for arrays of Reynolds number and relative roughness.
+        :param Re: array of Reynolds numbers (> 0)
+        :param rr: array of relative roughness
+        :return: (f, df/dRe) arrays
+        '''
+        Re = np.atleast_1d(np.asarray(Re, dtype=float))
+        rr = np.broadcast_to(np.asarray(rr, dtype=float), Re.shape)
+        logf, dlogf = self.interpolate(np.log(np.clip(Re, *self.ReRange)), np.log(np.clip(rr, *self.rrRange)))
+        f = np.exp(logf)
+        slope = f * dlogf / Re  # d(log f)/d(log Re) = Re/f df/dRe
+        outside = (Re < self.ReRange[0]) | (Re > self.ReRange[1]) | (rr > self.rrRange[1])
+        if np.any(outside):
+            f[outside], slope[outside] = frictionFactor(Re[outside], rr[outside], self.method, self.transition)
+        return f, slope
+
+    def getSettings(self):
+        '''
+        The settings a saved table must match to be reused.
+        :return: a 1-D array of floats and a string
+        '''
+        text = '{} {} {}'.format(self.kind, self.method, self.transition)
+        return np.array([self.tol, *self.ReRange, *self.rrRange]), text
+
+    def save(self, filename):
+        '''
+        Saves the table in .npz format.  It is written through a file handle so that np.savez does not add a
+        .npz extension, and load finds the file under the same name.
+        :param filename: the file name
+        :return: nothing
+        '''
+        values, text = self.getSettings()
+        with open(filename, 'wb') as f:
+            np.savez(f, settings=values, text=np.array(text), maxError=np.array(self.maxError),
+                     x=self.x, y=self.y, z=self.getTable(), breaks=self.breaks)
+
+    def load(self, filename):
+        '''
+        Loads a table saved by save, if the file exists and was built with the same settings.
+        :param filename: the file name
+        :return: True if the table was loaded
+        '''
+        if not os.path.exists(filename):
+            return False
+        values, text = self.getSettings()
+        try:
+            with np.load(filename) as data:
+                if str(data['text']) != text or not np.array_equal(data['settings'], values):
+                    return False
+                self.x, self.y, self.breaks = data['x'], data['y'], data['breaks']
+                self.setTable(data['z'])
+                self.maxError = float(data['maxError'])
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+    #endregion
@@ -1,6 +1,6 @@
 class Loop():
     #region constructor
-    def __init__(self, Name='A', Pipes=[]):
+    def __init__(self, Name='A', Pipes=None):
         '''
         Defines a loop in a pipe network.  Note: the pipes must be listed in order.  The traversal of a pipe loop
         will begin at the start node of Pipe[0] and move in the positive direction of that pipe.  Hence, loops
@@ -10,21 +10,23 @@ class Loop():
         '''
         #region attributes
         self.name = Name
-        self.pipes = Pipes
+        self.pipes = [] if Pipes is None else Pipes
         #endregion
     #endregion
 
     #region methods
-    def getLoopHeadLoss(self):
+    def getLoopHeadLoss(self, method='colebrook', transition='smooth'):
         '''
         Calculates the net head loss as I traverse around the loop, in meters of fluid.
+        :param method: turbulent friction factor method or FrictionTable, see Pipe.FrictionFactor
+        :param transition: transition blend, see Pipe.FrictionFactor
         :return: net head loss in the loop
         '''
         deltaP = 0  #initialize to zero
         startNode = self.pipes[0].startNode  # begin at the start node of the first pipe
         for p in self.pipes:
             # calculates the head loss in the pipe considering loop traversal and flow directions
-            phl = p.getFlowHeadLoss(startNode)  # Ensure this method exists in Pipe class
+            phl = p.getFlowHeadLoss(startNode, method, transition)  # Ensure this method exists in Pipe class
             deltaP += phl #iterate through loop
             startNode = p.endNode if startNode != p.endNode else p.startNode  # move to the next node
         return deltaP
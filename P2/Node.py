@@ -1,17 +1,23 @@
 #region class definitions
 class Node():
     #region constructor
-    def __init__(self, Name='a', Pipes=[], ExtFlow=0):
+    def __init__(self, Name='a', Pipes=None, ExtFlow=0, FixedHead=None, DemandPattern=None):
         '''
         A node in a pipe network.
         :param Name: name of the node
         :param Pipes: a list/array of pipes connected to this node
         :param ExtFlow: any external flow into (+) or out (-) of this node in L/s
+        :param FixedHead: head in m of fluid held by a reservoir at this node, or None for a junction
+        :param DemandPattern: external flow in L/s at each timestep of an extended period simulation, repeated
+                              if the simulation is longer, or None to hold ExtFlow
         '''
         #region attributes
         self.name = Name
-        self.pipes = Pipes
+        self.pipes = [] if Pipes is None else Pipes
         self.extFlow = ExtFlow
+        self.fixedHead = FixedHead
+        self.demandPattern = DemandPattern
+        self.head = 0.0 if FixedHead is None else FixedHead  # head in m of fluid, set by the head-flow solver
         #endregion
     #endregion
 
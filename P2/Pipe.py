@@ -1,12 +1,15 @@
 import math
-import numpy as np
-import random as rnd
-from scipy.optimize import fsolve
 from Fluid import Fluid
+from FrictionFactor import frictionFactor
 
 class Pipe():
+    # The attributes are fixed so pipes stay small in large networks.  Velocity, Reynolds number, friction factor
+    # and head loss are cached and only recomputed after Q, d, r or fluid has been set (see invalidate).
+    __slots__ = ('startNode', 'endNode', '_length', '_r', '_d', '_fluid', '_Q', '_A', '_relrough', '_vel',
+                 '_reynolds', '_ff', '_ffKey', '_hl')
+
     #region constructor
-    def __init__(self, Start='A', End='B', L=100, D=200, r=0.00025, fluid=Fluid()):
+    def __init__(self, Start='A', End='B', L=100, D=200, r=0.00025, fluid=None):
         '''
         Defines a generic pipe with orientation from lowest letter to highest, alphabetically.
         :param Start: the start node (string)
@@ -14,87 +17,173 @@ class Pipe():
         :param L: the pipe length in m (float)
         :param D: the pipe diameter in mm (float)
         :param r: the pipe roughness in m  (float)
-        :param fluid:  a Fluid object (typically water)
+        :param fluid:  a Fluid object (default water)
         '''
         self.startNode = min(Start, End)  #makes sure to use lowest letter for startNode
         self.endNode = max(Start, End)  #uses highest letter for endNode
-        self.length = L
-        self.r = r
-        self.fluid = fluid  # the fluid in the pipe
+        self._length = L
+        self._r = r
+        self._fluid = Fluid() if fluid is None else fluid  # the fluid in the pipe
+
+        self._d = D / 1000.0  # diameter in meters
+        self._Q = 10  # initial guess for flow rate in L/s
+        self.setGeometry()
+
+    #region properties
+    @property
+    def Q(self):
+        '''volumetric flow rate in L/s, positive from startNode to endNode'''
+        return self._Q
+
+    @Q.setter
+    def Q(self, value):
+        if value != self._Q:
+            self._Q = value
+            self.invalidate()
+
+    @property
+    def length(self):
+        '''pipe length in m'''
+        return self._length
+
+    @length.setter
+    def length(self, value):
+        self._length = value
+        self.invalidate()
+
+    @property
+    def d(self):
+        '''pipe diameter in m'''
+        return self._d
+
+    @d.setter
+    def d(self, value):
+        self._d = value
+        self.setGeometry()
+
+    @property
+    def r(self):
+        '''pipe roughness in m'''
+        return self._r
+
+    @r.setter
+    def r(self, value):
+        self._r = value
+        self.setGeometry()
+
+    @property
+    def fluid(self):
+        '''the Fluid object in the pipe (set a new one rather than changing its properties in place)'''
+        return self._fluid
+
+    @fluid.setter
+    def fluid(self, value):
+        self._fluid = value
+        self.invalidate()
+
+    @property
+    def A(self):
+        '''pipe cross-sectional area in m^2'''
+        return self._A
 
-        self.d = D / 1000.0  # diameter in meters
-        self.relrough = self.r / self.d  # relative roughness
-        self.A = math.pi / 4.0 * self.d ** 2  # pipe cross-sectional area
-        self.Q = 10  # initial guess for flow rate in L/s
-        self.vel = self.V()  # calculate velocity
-        self.reynolds = self.Re()  # calculate Reynolds number
+    @property
+    def relrough(self):
+        '''relative roughness r/d'''
+        return self._relrough
+
+    @property
+    def vel(self):
+        '''average velocity in m/s'''
+        return self.V()
+
+    @property
+    def reynolds(self):
+        '''Reynolds number'''
+        return self.Re()
+    #endregion
 
     #region methods
+    def setGeometry(self):
+        '''
+        Updates the area and relative roughness after d or r has changed.
+        :return: nothing
+        '''
+        self._A = math.pi / 4.0 * self._d ** 2  # pipe cross-sectional area
+        self._relrough = self._r / self._d  # relative roughness
+        self.invalidate()
+
+    def invalidate(self):
+        '''
+        Marks the cached velocity, Reynolds number, friction factor and head loss as out of date.
+        :return: nothing
+        '''
+        self._vel = self._reynolds = self._ff = self._ffKey = self._hl = None
+
     def V(self):
         '''
         Calculate average velocity in the pipe for volumetric flow self.Q
         :return: the average velocity in m/s
         '''
-        self.vel = (self.Q / 1000) / self.A  # convert L/s to m^3/s and compute velocity
-        return self.vel #avg velocity (Q/A)
+        if self._vel is None:
+            self._vel = (self._Q / 1000) / self._A  # convert L/s to m^3/s and compute velocity
+        return self._vel #avg velocity (Q/A)
 
     def Re(self):
         '''
         Calculate the Reynolds number under current conditions.
         :return: Reynolds number
         '''
-        self.reynolds = (self.fluid.rho * self.V() * self.d) / self.fluid.mu
-        # Re=rho*V*d/mu, be sure to use V() so velocity is updated.
-        return self.reynolds
+        if self._reynolds is None:
+            # Re=rho*|V|*d/mu.  Flow direction does not change Re.
+            self._reynolds = (self._fluid.rho * abs(self.V()) * self._d) / self._fluid.mu
+        return self._reynolds
 
-    def FrictionFactor(self):
+    def FrictionFactor(self, method='colebrook', transition='smooth'):
         '''
         Calculates the Darcy-Weisbach friction factor based on flow conditions.
+        Laminar below Re=2000, turbulent above Re=4000 and a deterministic blend of the two in between (see
+        PipeNetwork.transitionEnsemble for the spread of flows that transition uncertainty causes).
+        The result is cached until the flow or the pipe changes.
+        :param method: turbulent friction factor method, see FrictionFactor.turbulentFrictionFactor, or a
+                       FrictionTable to look the friction factor up in
+        :param transition: transition blend, see FrictionFactor.frictionFactor (ignored for a FrictionTable)
         :return: the (Darcy) friction factor
         '''
-        Re = self.Re() #updates re number, assigns to local Re
-        rr = self.relrough #rr for turbulent flow
-
-        def CB(): #numpy log is ln, log10 is log base 10
-            cb = lambda f: 1 / (f ** 0.5) + 2.0 * np.log10(rr / 3.7 + 2.51 / (Re * f ** 0.5))
-            result = fsolve(cb, (0.01)) #fsolves for
-            return result[0]
-
-        def lam(): #laminar formula
-            return 64 / Re
-
-        if Re >= 4000:
-            return CB() #return true for turbulent
-        if Re <= 2000:
-            return lam() #conditions to return true for laminar
-
-        CBff = CB() #ambiguous transition flow, use norm variate weighted by Re
-        Lamff = lam()
-        mean = Lamff + ((Re - 2000) / (4000 - 2000)) * (CBff - Lamff) #linear interpolation for mean
-        sig = 0.2 * mean #standard deviation
-        return rnd.normalvariate(mean, sig) #adding randomness by normvariate
+        if self._ffKey != (method, transition):
+            ff = frictionFactor(self.Re(), self._relrough, method, transition) if isinstance(method, str) else \
+                method.frictionFactor(self.Re(), self._relrough)
+            self._ff = float(ff[0][0])
+            self._ffKey = (method, transition)
+            self._hl = None
+        return self._ff
 
-    def frictionHeadLoss(self):
+    def frictionHeadLoss(self, method='colebrook', transition='smooth'):
         '''
-        Use the Darcy-Weisbach equation to find the head loss through a section of pipe.
+        Use the Darcy-Weisbach equation to find the head loss through a section of pipe.  The result is cached, so
+        a pipe shared by two loops is only evaluated once for a given flow.
+        :param method: turbulent friction factor method or FrictionTable, see FrictionFactor
+        :param transition: transition blend, see FrictionFactor
         :return: head loss in m of fluid
         '''
         g = 9.81  # gravity in m/s^2
-        ff = self.FrictionFactor() #calculate ff
-        hl = ff * (self.length / self.d) * ((self.V() ** 2) / (2 * g)) #formula for head loss in m of water
-        return hl
+        ff = self.FrictionFactor(method, transition) #calculate ff
+        if self._hl is None:
+            self._hl = ff * (self._length / self._d) * ((self.V() ** 2) / (2 * g)) #formula for head loss in m of water
+        return self._hl
 
-    def getFlowHeadLoss(self, s):
+    def getFlowHeadLoss(self, s, method='colebrook', transition='smooth'):
         '''
         Calculate the head loss for the pipe.
         :param s: the node I'm starting with in a traversal of the pipe
+        :param method: turbulent friction factor method or FrictionTable, see FrictionFactor
+        :param transition: transition blend, see FrictionFactor
         :return: the signed headloss through the pipe in m of fluid
         '''
         # while traversing a loop, if s = startNode I'm traversing in same direction as positive pipe
         nTraverse = 1 if s == self.startNode else -1
         # if flow is positive sense, scalar =1 else =-1
         nFlow = 1 if self.Q >= 0 else -1
-        return nTraverse * nFlow * self.frictionHeadLoss()
+        return nTraverse * nFlow * self.frictionHeadLoss(method, transition)
 
     def Name(self):
         '''
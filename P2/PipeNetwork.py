@@ -1,40 +1,81 @@
 #region imports
+import csv
+import hashlib
+import os
+import warnings
+from multiprocessing import Pool
+from collections import deque
 from scipy.optimize import fsolve
+from scipy import sparse
+from scipy.sparse import coo_matrix
+from scipy.sparse.linalg import spsolve, splu
+from scipy.sparse.csgraph import connected_components
 import numpy as np
 from Fluid import Fluid
 from Node import Node
+from Pipe import Pipe
+from Loop import Loop
+from FrictionFactor import frictionFactor, roughnessSlope, transitionNoise
 #endregion
 
+CACHE_VERSION = 1  # bump when the layout of the compiled network cache changes
+
 class PipeNetwork():
     # region constructor
-    def __init__(self, Pipes=[], Loops=[], Nodes=[], fluid=Fluid()):
+    def __init__(self, Pipes=None, Loops=None, Nodes=None, fluid=None):
         '''
         The pipe network is built from pipe, node, loop, and fluid objects.
+        Name lookups go through dictionaries that are brought up to date whenever pipes or nodes have been added
+        to the lists, and compileNetwork gathers the pipe data into arrays for the solvers.
         :param Pipes: a list of pipe objects
         :param Loops: a list of loop objects
         :param Nodes: a list of node objects
-        :param fluid: a fluid object
+        :param fluid: a fluid object (default water)
         '''
         #region attributes
-        self.loops = Loops
-        self.nodes = Nodes
-        self.Fluid = fluid
-        self.pipes = Pipes
+        self.loops = [] if Loops is None else list(Loops)
+        self.nodes = [] if Nodes is None else list(Nodes)
+        self.Fluid = Fluid() if fluid is None else fluid
+        self.pipes = [] if Pipes is None else list(Pipes)
+        self.pipeIndex = {}  # pipe name -> index in self.pipes
+        self.nodeIndex = {}  # node name -> index in self.nodes
+        self.nodePipes = {}  # node name -> list of indices of the pipes connected to it
+        self.compiledSize = None  # (pipes, nodes) at the last compileNetwork, None if not compiled since a reload
+        self.friction = 'colebrook'  # friction method of the last solve, for the loop head loss reports
+        self.transition = 'smooth'  # transition blend of the last solve
         #endregion
     #endregion
 
     # region methods
-    def findFlowRates(self):
+    def findFlowRates(self, method='newton', tol=1e-8, maxiter=50, friction='colebrook', transition='smooth'):
         '''
         Analyzes the pipe network and finds the flow rates in each pipe given the constraints of:
         1) No net flow into a node
         2) No net pressure drops in the loops.
+        :param method: 'newton' for Newton-Raphson on the loop equations with an analytic Jacobian (see
+                       newtonFlowRates), 'gga' for the Global Gradient Algorithm on heads and flows (see
+                       ggaFlowRates, needs no loops and supports reservoirs) or 'fsolve'
+        :param tol: convergence tolerance on the largest equation residual for 'newton' and 'gga'
+        :param maxiter: iteration limit for 'newton' and 'gga'
+        :param friction: turbulent friction factor method, see FrictionFactor.turbulentFrictionFactor, or a
+                         FrictionTable to look friction factors up in
+        :param transition: transition blend, see FrictionFactor.frictionFactor
         :return: a list of flow rates in the pipes
         '''
+        if method == 'newton':
+            return self.newtonFlowRates(tol=tol, maxiter=maxiter, friction=friction, transition=transition)
+        if method == 'gga':
+            return self.ggaFlowRates(tol=tol, maxiter=maxiter, friction=friction, transition=transition)
+        if method != 'fsolve':
+            raise ValueError("Unknown method '{}'".format(method))
+        if len(self.loops) == 0:
+            self.findLoops()  # e.g. a network read from a file, which gives no loops
         # see how many nodes and loops there are, this is how many equation results I will return
         N = len(self.nodes) + len(self.loops)  # Number of equations
         # note that I only have 10 pipes, but need 11 variables because of the degenerate node equation at b
         Q0 = np.full(N, 10)  # Initial guess for flow rates
+        self.friction, self.transition = friction, transition  # the loop equations use them
+        self.compileNetwork()  # once per solve, the residual reuses the incidence matrix
 
         def fn(q):
             '''
@@ -42,12 +83,12 @@ class PipeNetwork():
             :param q: an array of flow rates in pipes
             :return: an array containing flow balance at nodes and pressure losses in loops
             '''
-            # Update the flow rate in each pipe object
+            # Update the flow rate in each pipe object, which the loops read
             for i in range(len(self.pipes)):
                 self.pipes[i].Q = q[i] # set volumetric flow rate from input argument q
 
             # Calc net flow rate at each node (should sum to zero)
-            L = self.getNodeFlowRates() # call the getNodeFlowRates function of this class
+            L = self.getNodeFlowRates(q[:len(self.pipes)]) # call the getNodeFlowRates function of this class
 
             # Calc net head loss at each loop (should sum to zero)
             L += self.getLoopHeadLosses() # call the getLoopHeadLosses function of this class
@@ -58,20 +99,849 @@ class PipeNetwork():
         FR = fsolve(fn, Q0)
         return FR
 
-    def getNodeFlowRates(self):
+    def updateIndex(self):
+        '''
+        Brings the name -> index dictionaries up to date with self.pipes and self.nodes.  Pipes and nodes are only
+        ever appended, so only the new entries are indexed; the lists are fully reindexed if they got shorter.
+        :return: nothing
+        '''
+        if len(self.pipeIndex) > len(self.pipes) or len(self.nodeIndex) > len(self.nodes):
+            self.pipeIndex, self.nodeIndex, self.nodePipes = {}, {}, {}
+            self.compiledSize = None
+        for k in range(len(self.pipeIndex), len(self.pipes)):
+            p = self.pipes[k]
+            self.pipeIndex[p.Name()] = k
+            self.nodePipes.setdefault(p.startNode, []).append(k)
+            if p.endNode != p.startNode:
+                self.nodePipes.setdefault(p.endNode, []).append(k)
+        for k in range(len(self.nodeIndex), len(self.nodes)):
+            self.nodeIndex[self.nodes[k].name] = k
+
+    def compileNetwork(self):
+        '''
+        Gathers the network into arrays, one entry per pipe in self.pipes order or per node in self.nodes order:
+        self.L (length in m), self.D (diameter in m), self.roughness (m), self.Q (flow in L/s), self.pipeStart and
+        self.pipeEnd (node indices), self.extFlow (L/s) and self.fixedHead (m, nan for junctions), plus the sparse
+        node-pipe incidence matrix
+        self.incidence.  Nodes are built first if any pipe end has no node yet.
+        :return: nothing
+        '''
+        self.updateIndex()
+        if any(n not in self.nodeIndex for n in self.nodePipes):
+            self.buildNodes()
+        nP = len(self.pipes)
+        self.L = np.fromiter((p.length for p in self.pipes), dtype=float, count=nP)
+        self.D = np.fromiter((p.d for p in self.pipes), dtype=float, count=nP)
+        self.roughness = np.fromiter((p.r for p in self.pipes), dtype=float, count=nP)
+        self.Q = np.fromiter((p.Q for p in self.pipes), dtype=float, count=nP)
+        self.pipeStart = np.fromiter((self.nodeIndex[p.startNode] for p in self.pipes), dtype=np.intp, count=nP)
+        self.pipeEnd = np.fromiter((self.nodeIndex[p.endNode] for p in self.pipes), dtype=np.intp, count=nP)
+        self.extFlow = np.fromiter((n.extFlow for n in self.nodes), dtype=float, count=len(self.nodes))
+        self.fixedHead = np.array([np.nan if n.fixedHead is None else n.fixedHead for n in self.nodes], dtype=float)
+        cols = np.arange(nP)
+        self.incidence = coo_matrix((np.concatenate((-np.ones(nP), np.ones(nP))), (
+            np.concatenate((self.pipeStart, self.pipeEnd)), np.concatenate((cols, cols)))),
+            shape=(len(self.nodes), nP)).tocsr()
+        self.compiledSize = (nP, len(self.nodes))
+
+    def ensureCompiled(self):
+        '''
+        Compiles the network only if pipes or nodes were added or the network was reloaded since the last
+        compileNetwork, so repeated calls reuse the compiled arrays and incidence matrix.  Changes to the
+        properties of existing pipes and nodes still need an explicit compileNetwork.
+        :return: nothing
+        '''
+        if self.compiledSize != (len(self.pipes), len(self.nodes)):
+            self.compileNetwork()
+
+    def getIncidenceMatrix(self):
+        '''
+        Node-pipe incidence matrix: entry (node, pipe) is +1 if the pipe's positive flow enters the node (endNode),
+        -1 if it leaves the node (startNode) and 0 otherwise.  Rows follow self.nodes and columns self.pipes.
+        :return: a scipy.sparse CSR matrix
+        '''
+        self.ensureCompiled()
+        return self.incidence
+
+    def getLoopMatrix(self):
+        '''
+        Loop-pipe matrix: entry (loop, pipe) is +1 if the loop traverses the pipe in its positive direction,
+        -1 if it traverses it backwards and 0 if the pipe is not in the loop.  Traversal follows
+        Loop.getLoopHeadLoss, starting at the start node of the loop's first pipe.
+        :return: a scipy.sparse CSR matrix
+        '''
+        col = {id(p): j for j, p in enumerate(self.pipes)}
+        rows, cols, vals = [], [], []
+        for l, loop in enumerate(self.loops):
+            node = loop.pipes[0].startNode
+            for p in loop.pipes:
+                rows.append(l)
+                cols.append(col[id(p)])
+                vals.append(1 if node == p.startNode else -1)
+                node = p.endNode if node != p.endNode else p.startNode
+        return coo_matrix((vals, (rows, cols)), shape=(len(self.loops), len(self.pipes))).tocsr()
+
+    def getPipeProperties(self):
+        '''
+        Head loss coefficients of every pipe, from the arrays of the last compileNetwork.
+        :return: a dictionary of arrays: 'k' (head loss coefficient L/d/(2g)/(1000A)^2), 'reCoef' (Re per L/s),
+                 'lamCoef' (laminar head loss per L/s) and 'rr' (relative roughness)
+        '''
+        g = 9.81  # gravity in m/s^2
+        rho = np.fromiter((p.fluid.rho for p in self.pipes), dtype=float, count=len(self.pipes))
+        mu = np.fromiter((p.fluid.mu for p in self.pipes), dtype=float, count=len(self.pipes))
+        d = self.D
+        A = np.pi / 4.0 * d ** 2
+        k = (self.L / d) / (2 * g) / (1000 * A) ** 2
+        return {'k': k, 'reCoef': rho * d / (mu * 1000 * A), 'lamCoef': 64 * mu * 1000 * A * k / (rho * d),
+                'rr': self.roughness / d}
+
+    def getHeadLossesAndSlopes(self, q, props=None, friction='colebrook', transition='smooth', noise=None,
+                               sigma=0.2):
+        '''
+        Signed head losses along the positive direction of every pipe and their slopes d(hl)/dQ, evaluated for all
+        pipes at once with the vectorized friction factor engine (see FrictionFactor.frictionFactor).  In turbulent
+        flow hl = f*k*Q*|Q| with k = L/d/(2g)/(1000A)^2, so d(hl)/dQ = k*|Q|*(2f + Re*df/dRe); in laminar flow hl is
+        linear in Q, which also covers Q = 0.
+        :param q: array of pipe flow rates in L/s
+        :param props: arrays from getPipeProperties (the network is compiled and they are found if not given)
+        :param friction: turbulent friction factor method, see FrictionFactor.turbulentFrictionFactor, or a
+                         FrictionTable to look friction factors up in
+        :param transition: transition blend, see FrictionFactor.frictionFactor (ignored for a FrictionTable)
+        :param noise: optional standard normal draw for each pipe that scales its transition friction factor,
+                      see FrictionFactor.transitionNoise
+        :param sigma: relative spread of the transition friction factor for noise
+        :return: (head losses in m of fluid, slopes in m per L/s) arrays
+        '''
+        if props is None:
+            self.compileNetwork()
+            props = self.getPipeProperties()
+        q = np.asarray(q, dtype=float)
+        hl = props['lamCoef'] * q  # laminar flow, hl is linear in Q
+        slope = props['lamCoef'].copy()
+        Re = props['reCoef'] * np.abs(q)
+        turb = Re > 2000
+        if np.any(turb):
+            k, Qt = props['k'][turb], q[turb]
+            if isinstance(friction, str):
+                ff, dfdRe = frictionFactor(Re[turb], props['rr'][turb], friction, transition)
+            else:
+                ff, dfdRe = friction.frictionFactor(Re[turb], props['rr'][turb])
+            if noise is not None:
+                scale, dscale = transitionNoise(Re[turb], np.asarray(noise)[turb], sigma)
+                ff, dfdRe = ff * scale, dfdRe * scale + ff * dscale
+            hl[turb] = ff * k * Qt * np.abs(Qt)
+            slope[turb] = k * np.abs(Qt) * (2 * ff + Re[turb] * dfdRe)
+        return hl, slope
+
+    def newtonFlowRates(self, Q0=None, tol=1e-8, maxiter=50, friction='colebrook', transition='smooth', noise=None,
+                        sigma=0.2, compile=True):
+        '''
+        Solves for the pipe flow rates with a damped Newton-Raphson method using an analytic Jacobian.
+        The equations are node continuity, with one redundant node per connected network dropped, and zero head
+        loss around each loop.  The dropped node is the reservoir (Node.fixedHead) if the network has one, so the
+        reservoir supplies whatever the junctions draw; a connected network with more than one reservoir needs
+        the head equations between them, so use ggaFlowRates for it.  Continuity rows of the Jacobian are the
+        node-pipe incidence matrix and loop rows are the loop-pipe matrix times d(head loss)/dQ of each pipe
+        (Darcy-Weisbach with the Colebrook slope), and all pipes are evaluated together by
+        getHeadLossesAndSlopes.  Steps are halved until the residual norm decreases.
+        If no loops have been given, an independent set is found with findLoops.
+        A convergence report is stored in self.solverReport.
+        :param Q0: initial guess of the flow rates in L/s (default is the current pipe flows)
+        :param tol: convergence tolerance on the largest equation residual
+        :param maxiter: iteration limit
+        :param friction: turbulent friction factor method, see FrictionFactor.turbulentFrictionFactor, or a
+                         FrictionTable to look friction factors up in
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :param noise: optional standard normal draw for each pipe's transition friction factor, see
+                      getHeadLossesAndSlopes
+        :param sigma: relative spread of the transition friction factor for noise
+        :param compile: False to reuse the arrays of the last compileNetwork, e.g. after changing self.extFlow
+        :return: an array of flow rates in the pipes in L/s
+        '''
+        if len(self.loops) == 0:
+            self.findLoops()
+        if compile:
+            self.compileNetwork()
+        # drop one continuity equation per connected network, they are redundant: the reservoir's if there is one
+        nN = len(self.nodes)
+        nComp, comp = connected_components(coo_matrix((np.ones(len(self.pipes)), (self.pipeStart, self.pipeEnd)),
+                                                      shape=(nN, nN)), directed=False)
+        held = ~np.isnan(self.fixedHead)
+        if np.any(np.bincount(comp[held], minlength=nComp) > 1):
+            raise ValueError("Newton cannot hold the heads of several reservoirs in one network; "
+                             "use method='gga'")
+        keep = ~held
+        first = np.unique(comp, return_index=True)[1]
+        keep[first[~np.isin(np.arange(nComp), comp[held])]] = False
+        A, ext = self.incidence[keep], self.extFlow[keep]
+        B = self.getLoopMatrix()
+        if A.shape[0] + B.shape[0] != len(self.pipes):
+            raise ValueError("Need {} independent loops but {} were given; try findLoops()".format(
+                len(self.pipes) - A.shape[0], B.shape[0]))
+        props = self.getPipeProperties()
+
+        def residual(q):
+            # evaluate the equations and the head loss slopes of all pipes at once
+            hl, slope = self.getHeadLossesAndSlopes(q, props, friction, transition, noise, sigma)
+            return np.concatenate((A @ q + ext, B @ hl)), slope
+
+        q = self.Q.copy() if Q0 is None else np.array(Q0, dtype=float)
+        F, slope = residual(q)
+        nEval = 1
+        it = 0
+        while np.max(np.abs(F)) > tol and it < maxiter:
+            J = sparse.vstack((A, B.multiply(slope))).tocsc()
+            dq = spsolve(J, -F)
+            # backtracking line search on the residual norm
+            alpha, norm0 = 1.0, np.linalg.norm(F)
+            while True:
+                Fn, slopeN = residual(q + alpha * dq)
+                nEval += 1
+                if np.linalg.norm(Fn) < (1 - 1e-4 * alpha) * norm0 or alpha < 1.0 / 64:
+                    break
+                alpha /= 2
+            q, F, slope = q + alpha * dq, Fn, slopeN
+            it += 1
+        self.setFlowRates(q)
+        self.friction, self.transition = friction, transition
+        self.solverReport = {'converged': bool(np.max(np.abs(F)) <= tol), 'iterations': it,
+                             'evaluations': nEval, 'residual': float(np.max(np.abs(F)))}
+        if not self.solverReport['converged']:
+            warnings.warn("Newton did not converge: residual {:0.3g} after {} iterations".format(
+                self.solverReport['residual'], it))
+        return q
+
+    def ggaFlowRates(self, Q0=None, tol=1e-8, maxiter=50, friction='colebrook', transition='smooth', noise=None,
+                     sigma=0.2, H0=None, compile=True):
+        '''
+        Solves for the pipe flow rates and node heads together with the Global Gradient Algorithm of Todini and
+        Pilati.  The unknowns are the flow in every pipe and the head at every junction; nodes with a fixedHead
+        are reservoirs whose head is held and whose external flow is whatever the network draws.  The equations
+        are head loss along each pipe, hl(Q) = H(start) - H(end), and continuity at each junction.  Each Newton
+        step eliminates the flow corrections, leaving a sparse symmetric positive definite system in the head
+        corrections, (A D^-1 A^T) dH = rhs with A the junction-pipe incidence and D the head loss slopes.  Its
+        sparsity pattern and fill reducing ordering depend only on the topology, so they are kept (see
+        getGGAStructure) and each iteration only fills in values and factors.  No loops are needed and there is
+        no redundant continuity equation.  A network part with no reservoir has its first node held at head 0, so
+        its heads are relative.  Steps are halved until the residual norm decreases.
+        Heads are stored in self.H and each Node.head, and a convergence report in self.solverReport.
+        :param Q0: initial guess of the flow rates in L/s (default is the current pipe flows)
+        :param tol: convergence tolerance on the largest residual (m of head and L/s)
+        :param maxiter: iteration limit
+        :param friction: turbulent friction factor method, see FrictionFactor.turbulentFrictionFactor, or a
+                         FrictionTable to look friction factors up in
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :param noise: optional standard normal draw for each pipe's transition friction factor, see
+                      getHeadLossesAndSlopes
+        :param sigma: relative spread of the transition friction factor for noise
+        :param H0: initial guess of the node heads in m, in self.nodes order (default is the current Node.head)
+        :param compile: False to reuse the arrays of the last compileNetwork, e.g. after changing self.extFlow
+        :return: an array of flow rates in the pipes in L/s
+        '''
+        if compile:
+            self.compileNetwork()
+        S = self.getGGAStructure()
+        junction, fixed = S['junction'], S['fixed']
+        A, AT = S['A'], S['AT']
+        ext = self.extFlow[junction]
+        H = np.fromiter((n.head for n in self.nodes), dtype=float, count=len(self.nodes)) if H0 is None else \
+            np.array(H0, dtype=float)
+        H[fixed] = np.where(np.isnan(self.fixedHead), 0.0, self.fixedHead)[fixed]
+        hF = S['AFT'] @ H[fixed]
+        props = self.getPipeProperties()
+
+        def residual(q, h):
+            # energy along each pipe and continuity at each junction, and the head loss slopes
+            hl, slope = self.getHeadLossesAndSlopes(q, props, friction, transition, noise, sigma)
+            return hl + AT @ h + hF, A @ q + ext, slope
+
+        q = self.Q.copy() if Q0 is None else np.array(Q0, dtype=float)
+        h = H[junction]
+        r1, r2, slope = residual(q, h)
+        nEval = 1
+        it = 0
+        while max(np.max(np.abs(r1), initial=0), np.max(np.abs(r2), initial=0)) > tol and it < maxiter:
+            Dinv = 1.0 / slope
+            rhs = r2 - A @ (Dinv * r1)
+            dh = self.factorHeadMatrix(Dinv)(rhs)
+            dq = -Dinv * (r1 + AT @ dh)
+            # backtracking line search on the residual norm
+            alpha, norm0 = 1.0, np.sqrt(r1 @ r1 + r2 @ r2)
+            while True:
+                r1n, r2n, slopeN = residual(q + alpha * dq, h + alpha * dh)
+                nEval += 1
+                if np.sqrt(r1n @ r1n + r2n @ r2n) < (1 - 1e-4 * alpha) * norm0 or alpha < 1.0 / 64:
+                    break
+                alpha /= 2
+            q, h, r1, r2, slope = q + alpha * dq, h + alpha * dh, r1n, r2n, slopeN
+            it += 1
+        self.setFlowRates(q)
+        self.friction, self.transition = friction, transition
+        H[junction] = h
+        self.H = H
+        for n, hn in zip(self.nodes, H.tolist()):
+            n.head = hn
+        res = float(max(np.max(np.abs(r1), initial=0), np.max(np.abs(r2), initial=0)))
+        self.solverReport = {'converged': res <= tol, 'iterations': it, 'evaluations': nEval, 'residual': res}
+        if not self.solverReport['converged']:
+            warnings.warn("GGA did not converge: residual {:0.3g} after {} iterations".format(res, it))
+        return q
+
+    def getGGAStructure(self):
+        '''
+        The parts of a GGA solve that depend only on the topology of the compiled network, kept in
+        self.ggaStructure until the pipe ends or the reservoirs change: which nodes are held ('fixed', a mask, with
+        the first node of every part without a reservoir added) and which are 'junction's, the junction and fixed
+        head incidence matrices 'A', 'AT' and 'AFT', and the sparsity pattern of A D^-1 A^T in CSC form
+        ('indices', 'indptr') with the sparse matrix 'assemble' that maps the pipe weights D^-1 to its values.
+        'perm' is the fill reducing ordering of the junctions the pattern is stored in, None until the first
+        factorization has found one (see setGGAOrdering).
+        :return: a dictionary
+        '''
+        nN = len(self.nodes)
+        held = ~np.isnan(self.fixedHead)
+        S = getattr(self, 'ggaStructure', None)
+        if S is not None and np.array_equal(S['held'], held) and np.array_equal(S['pipeStart'], self.pipeStart) \
+                and np.array_equal(S['pipeEnd'], self.pipeEnd):
+            return S
+        # hold the first node of every part without a reservoir at head 0
+        nComp, comp = connected_components(coo_matrix((np.ones(len(self.pipes)), (self.pipeStart, self.pipeEnd)),
+                                                      shape=(nN, nN)), directed=False)
+        fixed = held.copy()
+        first = np.unique(comp, return_index=True)[1]
+        fixed[first[~np.isin(np.arange(nComp), comp[held])]] = True
+        junction = np.flatnonzero(~fixed)
+        A = self.incidence[junction]
+        self.ggaStructure = {'held': held, 'pipeStart': self.pipeStart, 'pipeEnd': self.pipeEnd, 'fixed': fixed,
+                             'junction': junction, 'A': A, 'AT': A.T.tocsr(),
+                             'AFT': self.incidence[fixed].T.tocsr()}
+        self.setGGAOrdering(None)
+        return self.ggaStructure
+
+    def factorHeadMatrix(self, Dinv):
+        '''
+        Factors the GGA head matrix M = A D^-1 A^T of self.ggaStructure.  M is symmetric, so it is factored with
+        a symmetric ordering and no pivoting; the first factorization finds a minimum degree ordering and later
+        ones reuse it with M assembled already permuted.
+        :param Dinv: 1/(d(head loss)/dQ) of every pipe
+        :return: a function that solves M x = b for a vector b or a 2-D array b of right hand sides
+        '''
+        S = self.ggaStructure
+        nJ, perm = len(S['junction']), S['perm']
+        if nJ == 0:
+            return lambda b: np.zeros(np.shape(b))
+        M = sparse.csc_matrix((S['assemble'] @ Dinv, S['indices'], S['indptr']), shape=(nJ, nJ))
+        lu = splu(M, permc_spec='MMD_AT_PLUS_A' if perm is None else 'NATURAL', diag_pivot_thresh=0.0,
+                  options={'SymmetricMode': True})
+        if perm is None:
+            self.setGGAOrdering(np.argsort(lu.perm_c))
+            return lu.solve
+
+        def solve(b):
+            x = np.empty(np.shape(b))
+            x[perm] = lu.solve(np.ascontiguousarray(b[perm]))
+            return x
+        return solve
+
+    def setGGAOrdering(self, perm):
+        '''
+        Stores the sparsity pattern of the GGA head matrix A D^-1 A^T with its junctions in the given order.  Pipe
+        k between junctions a and b adds D^-1 to entries (a, a) and (b, b) and subtracts it from (a, b) and (b, a);
+        a pipe to a held node only adds to the diagonal of its junction.
+        :param perm: junction positions (into self.ggaStructure['junction']) in elimination order, or None for
+                     the natural order
+        :return: perm
+        '''
+        S = self.ggaStructure
+        nJ, nP = len(S['junction']), len(self.pipes)
+        pos = np.full(len(self.nodes), -1, dtype=np.intp)  # position in elimination order of each junction node
+        pos[S['junction']] = np.arange(nJ) if perm is None else np.argsort(perm)
+        a, b = pos[self.pipeStart], pos[self.pipeEnd]
+        k = np.arange(nP)
+        both = (a >= 0) & (b >= 0)
+        rows = np.concatenate((a, b, a[both], b[both]))
+        cols = np.concatenate((a, b, b[both], a[both]))
+        vals = np.concatenate((np.ones(2 * nP), -np.ones(2 * np.count_nonzero(both))))
+        pipe = np.concatenate((k, k, k[both], k[both]))
+        use = rows >= 0
+        keys, slot = np.unique(cols[use] * nJ + rows[use], return_inverse=True)  # sorted by column, then row
+        S['indices'] = keys % nJ
+        S['indptr'] = np.concatenate(([0], np.cumsum(np.bincount(keys // nJ, minlength=nJ))))
+        S['assemble'] = coo_matrix((vals[use], (slot.ravel(), pipe[use])), shape=(len(keys), nP)).tocsr()
+        S['perm'] = perm
+        return perm
+
+    def getHeadLossParameterSlopes(self, q, props=None, friction='colebrook', transition='smooth'):
+        '''
+        Derivatives of every pipe's head loss with respect to its own diameter and roughness.  With hl = f*k*Q|Q|,
+        k proportional to d^-5, Re to 1/d and rr = r/d, d(hl)/dd = -5hl/d - k*Q|Q|*(Re*df/dRe + rr*df/drr)/d
+        and d(hl)/dr = k*Q|Q|*(df/drr)/d.  Laminar head loss is proportional to d^-4 and does not depend on r.
+        A FrictionTable is differentiated through the law it tabulates.
+        :param q: array of pipe flow rates in L/s
+        :param props: arrays from getPipeProperties (the network is compiled and they are found if not given)
+        :param friction: turbulent friction factor method or FrictionTable, see getHeadLossesAndSlopes
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :return: (d(hl)/dD, d(hl)/d(roughness)) arrays, both in m of head per m
+        '''
+        if props is None:
+            self.compileNetwork()
+            props = self.getPipeProperties()
+        if not isinstance(friction, str):
+            friction, transition = friction.method, friction.transition
+        q = np.asarray(q, dtype=float)
+        hl = self.getHeadLossesAndSlopes(q, props, friction, transition)[0]
+        d = self.D
+        dD = -4 * hl / d
+        dr = np.zeros_like(hl)
+        Re = props['reCoef'] * np.abs(q)
+        turb = Re > 2000
+        if np.any(turb):
+            rr, dt = props['rr'][turb], d[turb]
+            dfdRe = frictionFactor(Re[turb], rr, friction, transition)[1]
+            dfdrr = roughnessSlope(Re[turb], rr, friction, transition)
+            c = props['k'][turb] * q[turb] * np.abs(q[turb])
+            dD[turb] = -5 * hl[turb] / dt - c * (Re[turb] * dfdRe + rr * dfdrr) / dt
+            dr[turb] = c * dfdrr / dt
+        return dD, dr
+
+    def getJacobianFactor(self, friction='colebrook', transition='smooth'):
+        '''
+        The Jacobian of the GGA equations (see ggaFlowRates) at the current pipe flows, factored through the head
+        matrix: J = [[D, A^T], [A, 0]] with D the head loss slopes.  It is kept in self.jacobianFactor and reused
+        until the flows or the pipe properties change, so any number of sensitivity and adjoint solves share one
+        factorization.  J is symmetric, so the same factorization serves the adjoint equations.
+        :param friction: turbulent friction factor method or FrictionTable, see getHeadLossesAndSlopes
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :return: a dictionary with 'solve' (see factorHeadMatrix), 'Dinv' (1/slope), 'props' (see
+                 getPipeProperties) and 'structure' (see getGGAStructure)
+        '''
+        self.compileNetwork()
+        S = self.getGGAStructure()
+        props = self.getPipeProperties()
+        J = getattr(self, 'jacobianFactor', None)
+        if J is not None and J['structure'] is S and J['friction'] is friction and J['transition'] == transition \
+                and np.array_equal(J['Q'], self.Q) and all(np.array_equal(J['props'][k], props[k]) for k in props):
+            return J
+        slope = self.getHeadLossesAndSlopes(self.Q, props, friction, transition)[1]
+        Dinv = 1.0 / slope
+        self.jacobianFactor = {'structure': S, 'friction': friction, 'transition': transition, 'Q': self.Q.copy(),
+                               'props': props, 'Dinv': Dinv, 'solve': self.factorHeadMatrix(Dinv)}
+        return self.jacobianFactor
+
+    def getSensitivities(self, parameter='D', names=None, friction='colebrook', transition='smooth',
+                         output='dense', dropTol=0.0):
+        '''
+        Sensitivities of the pipe flows and node heads to the pipe diameters, the pipe roughness or the node
+        external flows, at the current flows (which should be a converged solution).  Differentiating the GGA
+        equations r(x, p) = 0 gives J dx/dp = -dr/dp, and all the columns are found with one factorization of J
+        (see getJacobianFactor) and one solve with a block of right hand sides, rather than a nonlinear solve
+        per parameter.  Held heads (reservoirs, and the reference node of a part without one) do not change.
+        :param parameter: 'D' (pipe diameter in m), 'roughness' (pipe roughness in m) or 'extFlow' (node
+                          external flow in L/s)
+        :param names: names of the pipes (or nodes, for 'extFlow') to differentiate with respect to (default all)
+        :param friction: turbulent friction factor method or FrictionTable, see getHeadLossesAndSlopes
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :param output: 'dense' for NumPy arrays or 'sparse' for scipy.sparse CSR matrices
+        :param dropTol: for sparse output, entries no larger than this in magnitude are dropped
+        :return: (dQ/dp with one row per pipe, dH/dp with one row per node), one column per parameter
+        '''
+        J = self.getJacobianFactor(friction, transition)
+        S, Dinv = J['structure'], J['Dinv']
+        nP, nN, nJ = len(self.pipes), len(self.nodes), len(S['junction'])
+        if parameter in ('D', 'roughness'):
+            cols = np.arange(nP) if names is None else np.array([self.pipeIndex[n] for n in names], dtype=np.intp)
+            dD, dr = self.getHeadLossParameterSlopes(self.Q, J['props'], friction, transition)
+            g = (dD if parameter == 'D' else dr)[cols]
+            B1 = np.zeros((nP, len(cols)))  # -d(energy residual)/dp; continuity does not depend on the pipes
+            B1[cols, np.arange(len(cols))] = -g
+            rhs = S['A'] @ (Dinv[:, None] * B1)
+        elif parameter == 'extFlow':
+            cols = np.arange(nN) if names is None else np.array([self.nodeIndex[n] for n in names], dtype=np.intp)
+            pos = np.full(nN, -1, dtype=np.intp)
+            pos[S['junction']] = np.arange(nJ)
+            B1 = np.zeros((nP, len(cols)))
+            rhs = np.zeros((nJ, len(cols)))  # -d(continuity residual)/dp = -1 at a junction's own row
+            held = pos[cols] < 0
+            rhs[pos[cols][~held], np.flatnonzero(~held)] = 1.0  # the Schur complement right hand side is -B2
+        else:
+            raise ValueError("Unknown parameter '{}'".format(parameter))
+        dh = J['solve'](rhs)
+        dQ = Dinv[:, None] * (B1 - S['AT'] @ dh)
+        dH = np.zeros((nN, len(cols)))
+        dH[S['junction']] = dh
+        if output == 'sparse':
+            dQ[np.abs(dQ) <= dropTol] = 0.0
+            dH[np.abs(dH) <= dropTol] = 0.0
+            return sparse.csr_matrix(dQ), sparse.csr_matrix(dH)
+        if output != 'dense':
+            raise ValueError("Unknown output '{}'".format(output))
+        return dQ, dH
+
+    def getAdjointGradient(self, weights=None, headWeights=None, friction='colebrook', transition='smooth'):
+        '''
+        Gradient of one scalar of the solution, F = weights.Q + headWeights.H, with respect to every pipe
+        diameter, every pipe roughness and every node external flow, from a single adjoint solve
+        J lambda = (weights, headWeights) with the factorization of getJacobianFactor (J is symmetric).  Then
+        dF/dp = -lambda.dr/dp for each parameter, so the cost does not grow with the number of parameters.
+        :param weights: weight of each pipe flow in F (default none)
+        :param headWeights: weight of each node head in F, in self.nodes order (default none); held heads do not
+                            change, so their weights do not matter
+        :param friction: turbulent friction factor method or FrictionTable, see getHeadLossesAndSlopes
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :return: a dictionary with 'D' and 'roughness' (dF/dp per pipe, per m) and 'extFlow' (dF/dp per node,
+                 per L/s)
+        '''
+        J = self.getJacobianFactor(friction, transition)
+        S, Dinv = J['structure'], J['Dinv']
+        nP, nN = len(self.pipes), len(self.nodes)
+        w = np.zeros(nP) if weights is None else np.asarray(weights, dtype=float)
+        v = np.zeros(nN) if headWeights is None else np.asarray(headWeights, dtype=float)
+        lh = J['solve'](S['A'] @ (Dinv * w) - v[S['junction']])
+        lq = Dinv * (w - S['AT'] @ lh)
+        dD, dr = self.getHeadLossParameterSlopes(self.Q, J['props'], friction, transition)
+        dext = np.zeros(nN)
+        dext[S['junction']] = -lh
+        return {'D': -lq * dD, 'roughness': -lq * dr, 'extFlow': dext}
+
+    def getCutPipes(self):
+        '''
+        Finds the cut pipes (bridges) of the compiled network: pipes whose removal disconnects their two ends, so
+        every path between the parts they join runs through them.  One iterative depth first search with
+        Tarjan's low-link numbers, linear in the number of pipes.
+        :return: boolean array, True for each cut pipe
+        '''
+        nN, nP = len(self.nodes), len(self.pipes)
+        ends = np.concatenate((self.pipeStart, self.pipeEnd))
+        order = np.argsort(ends, kind='stable')
+        ptr = np.searchsorted(ends[order], np.arange(nN + 1)).tolist()
+        nbr = np.concatenate((self.pipeEnd, self.pipeStart))[order].tolist()
+        edge = np.concatenate((np.arange(nP), np.arange(nP)))[order].tolist()
+        disc, low = [-1] * nN, [0] * nN
+        cut = np.zeros(nP, dtype=bool)
+        t = 0
+        for root in range(nN):
+            if disc[root] >= 0:
+                continue
+            disc[root] = low[root] = t
+            t += 1
+            stack = [(root, -1, ptr[root])]  # (node, pipe it was reached by, next adjacency position)
+            while stack:
+                v, pe, i = stack[-1]
+                if i < ptr[v + 1]:
+                    stack[-1] = (v, pe, i + 1)
+                    if edge[i] == pe:
+                        continue
+                    w = nbr[i]
+                    if disc[w] < 0:
+                        disc[w] = low[w] = t
+                        t += 1
+                        stack.append((w, edge[i], ptr[w]))
+                    elif disc[w] < low[v]:
+                        low[v] = disc[w]
+                else:
+                    stack.pop()
+                    if stack:
+                        u = stack[-1][0]
+                        if low[v] < low[u]:
+                            low[u] = low[v]
+                        if low[v] > disc[u]:
+                            cut[pe] = True
+        return cut
+
+    def getNetworkZones(self):
+        '''
+        Splits the network into zones that can be solved independently.  Removing the cut pipes (see getCutPipes)
+        leaves blocks joined by the cut pipes in a forest.  Each tree is rooted at a block with a reservoir if it
+        has one.  If the subtree below a cut pipe has no reservoir, the cut pipe's flow is fixed by continuity
+        (it carries the subtree's net demand), so the pipe is split off and its flow becomes an external flow at
+        both ends.  A cut pipe with reservoirs on both sides is kept, and the blocks it joins form one zone.
+        :return: a dictionary with 'zone' (zone of each node), 'nZones', 'cut' (mask of the split pipes),
+                 'cutFlow' (their flows in L/s, 0 elsewhere), 'ext' (node external flows with the split pipes'
+                 flows added) and 'links' (list of (child zone, split pipe) in root to leaf order, for stitching
+                 heads)
+        '''
+        self.compileNetwork()
+        nN, nP = len(self.nodes), len(self.pipes)
+        bridge = self.getCutPipes()
+        keep = ~bridge
+        nB, block = connected_components(coo_matrix((np.ones(np.count_nonzero(keep)), (
+            self.pipeStart[keep], self.pipeEnd[keep])), shape=(nN, nN)), directed=False)
+        held = ~np.isnan(self.fixedHead)
+        subExt = np.bincount(block, weights=np.where(held, 0.0, self.extFlow), minlength=nB)
+        subHeld = np.bincount(block, weights=held, minlength=nB) > 0
+        adj = [[] for b in range(nB)]
+        for k in np.flatnonzero(bridge).tolist():
+            a, b = block[self.pipeStart[k]], block[self.pipeEnd[k]]
+            adj[a].append((b, k))
+            adj[b].append((a, k))
+        # breadth first over the block forest, starting from the blocks with reservoirs
+        parent, parentPipe = [-1] * nB, [-1] * nB
+        seen = np.zeros(nB, dtype=bool)
+        order = []
+        for r in np.argsort(~subHeld, kind='stable').tolist():
+            if seen[r]:
+                continue
+            seen[r] = True
+            queue = deque([r])
+            while queue:
+                b = queue.popleft()
+                order.append(b)
+                for c, k in adj[b]:
+                    if not seen[c]:
+                        seen[c] = True
+                        parent[c], parentPipe[c] = b, k
+                        queue.append(c)
+        for b in reversed(order):  # totals over each subtree
+            if parent[b] >= 0:
+                subExt[parent[b]] += subExt[b]
+                subHeld[parent[b]] |= subHeld[b]
+        root = list(range(nB))  # union-find over blocks joined by kept cut pipes
+
+        def find(b):
+            while root[b] != b:
+                root[b] = root[root[b]]
+                b = root[b]
+            return b
+        cut = np.zeros(nP, dtype=bool)
+        cutFlow = np.zeros(nP)
+        links = []
+        for b in order:
+            k = parentPipe[b]
+            if k < 0:
+                continue
+            if subHeld[b]:
+                root[find(b)] = find(parent[b])
+            else:
+                cut[k] = True
+                cutFlow[k] = -subExt[b] if block[self.pipeEnd[k]] == b else subExt[b]  # demand flows in
+                links.append((b, k))
+        nZones, zoneOfBlock = np.unique([find(b) for b in range(nB)], return_inverse=True)
+        zoneOfBlock = zoneOfBlock.ravel()
+        ext = self.extFlow.copy()
+        np.subtract.at(ext, self.pipeStart[cut], cutFlow[cut])
+        np.add.at(ext, self.pipeEnd[cut], cutFlow[cut])
+        return {'zone': zoneOfBlock[block], 'nZones': len(nZones), 'cut': cut, 'cutFlow': cutFlow, 'ext': ext,
+                'links': [(int(zoneOfBlock[b]), k) for b, k in links]}
+
+    def decomposedFlowRates(self, method='gga', processes=None, tol=1e-8, maxiter=50, friction='colebrook',
+                            transition='smooth'):
+        '''
+        Solves the network zone by zone (see getNetworkZones): hydraulically separate parts, and parts that only
+        hang off the rest through cut pipes, are solved as independent networks across a process pool and the
+        results are stitched back into the pipe flows.  For 'gga' the heads of a zone without a reservoir are
+        shifted to match the head loss along the cut pipe that feeds it.  The result is the same as solving the
+        whole network.
+        A convergence report over all zones is stored in self.solverReport.
+        :param method: 'gga' (see ggaFlowRates) or 'newton' (see newtonFlowRates)
+        :param processes: number of worker processes (default os.cpu_count(), 1 solves in this process)
+        :param tol: convergence tolerance of each zone solve
+        :param maxiter: iteration limit of each zone solve
+        :param friction: turbulent friction factor method or FrictionTable, see getHeadLossesAndSlopes
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :return: an array of flow rates in the pipes in L/s
+        '''
+        if method not in ('gga', 'newton'):
+            raise ValueError("Unknown method '{}'".format(method))
+        Z = self.getNetworkZones()
+        zone, cut = Z['zone'], Z['cut']
+        pipeZone = np.where(cut, -1, zone[self.pipeStart])
+        zonePipes = [[] for z in range(Z['nZones'])]
+        for k, z in enumerate(pipeZone.tolist()):
+            if z >= 0:
+                zonePipes[z].append(k)
+        zoneNodes = [[] for z in range(Z['nZones'])]
+        for i, z in enumerate(zone.tolist()):
+            zoneNodes[z].append(i)
+        jobs = []
+        for z in sorted(range(Z['nZones']), key=lambda z: -len(zonePipes[z])):  # largest first
+            if len(zonePipes[z]) == 0:
+                continue
+            nodes = [Node(self.nodes[i].name, [], Z['ext'][i], self.nodes[i].fixedHead) for i in zoneNodes[z]]
+            for n, i in zip(nodes, zoneNodes[z]):
+                n.head = self.nodes[i].head
+            net = PipeNetwork([self.pipes[k] for k in zonePipes[z]], Nodes=nodes, fluid=self.Fluid)
+            jobs.append((z, (net, method, tol, maxiter, friction, transition)))
+        if processes == 1 or len(jobs) < 2:
+            results = [solveZone(job) for z, job in jobs]
+        else:
+            with Pool(processes) as pool:
+                results = pool.map(solveZone, [job for z, job in jobs], chunksize=1)
+        q = Z['cutFlow'].copy()
+        H = np.zeros(len(self.nodes))
+        reports = []
+        for (z, job), (qz, Hz, report) in zip(jobs, results):
+            q[zonePipes[z]] = qz
+            if Hz is not None:
+                H[zoneNodes[z]] = Hz
+            reports.append(report)
+        self.setFlowRates(q)
+        self.friction, self.transition = friction, transition
+        if method == 'gga':
+            # shift the relative heads of zones without a reservoir, from the roots down
+            if len(Z['links']):
+                hl = self.getHeadLossesAndSlopes(q, None, friction, transition)[0]
+            for z, k in Z['links']:
+                a, b = self.pipeStart[k], self.pipeEnd[k]
+                if zone[b] == z:
+                    H[zoneNodes[z]] += H[a] - hl[k] - H[b]
+                else:
+                    H[zoneNodes[z]] += H[b] + hl[k] - H[a]
+            self.H = H
+            for n, hn in zip(self.nodes, H.tolist()):
+                n.head = hn
+        self.solverReport = {'converged': all(r['converged'] for r in reports),
+                             'iterations': max([r['iterations'] for r in reports], default=0),
+                             'evaluations': sum(r['evaluations'] for r in reports),
+                             'residual': max([r['residual'] for r in reports], default=0.0),
+                             'zones': len(jobs), 'cutPipes': int(np.count_nonzero(cut))}
+        if not self.solverReport['converged']:
+            warnings.warn("{} of {} zones did not converge".format(
+                sum(not r['converged'] for r in reports), len(reports)))
+        return q
+
+    def extendedPeriodSimulation(self, nSteps=None, timestep=3600.0, patterns=None, filename=None, method='gga',
+                                 tol=1e-8, maxiter=50, friction='colebrook', transition='smooth'):
+        '''
+        Extended period simulation: a sequence of steady solves as the external flows follow each node's demand
+        pattern (Node.demandPattern, or patterns).  The network is compiled once and each step only changes
+        self.extFlow, then warm starts from the flows (and, for 'gga', the heads) of the step before, so after
+        the first step a solve usually takes two or three Newton iterations.  The GGA head matrix keeps its
+        sparsity pattern and ordering for the whole run (see getGGAStructure).  The flows of each step are
+        written to filename as the run goes, so long runs of large networks need no memory for the history.
+        The pipe flows and node heads are left at the last step and the node external flows are not changed.
+        :param nSteps: number of timesteps (default: the length of the longest pattern)
+        :param timestep: time between steps in s
+        :param patterns: optional dictionary of node name -> external flow in L/s at each timestep, used in place
+                         of Node.demandPattern; patterns shorter than the run repeat
+        :param filename: file to stream the flows to: .csv for one row of step, time and pipe flows per step,
+                         otherwise a .npy array (nSteps, nPipes) in L/s; None keeps them in memory
+        :param method: 'gga' (see ggaFlowRates) or 'newton' (see newtonFlowRates)
+        :param tol: convergence tolerance of each solve
+        :param maxiter: iteration limit of each solve
+        :param friction: turbulent friction factor method or FrictionTable, see ggaFlowRates
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :return: a dictionary with 'time' (s), 'iterations', 'converged' and 'residual' per step, and 'flows'
+                 (nSteps, nPipes) in L/s when filename is None
+        '''
+        if method not in ('gga', 'newton'):
+            raise ValueError("Unknown method '{}'".format(method))
+        if method == 'newton' and len(self.loops) == 0:
+            self.findLoops()
+        self.compileNetwork()
+        patterns = {} if patterns is None else patterns
+        series = {}  # node index -> pattern
+        for i, n in enumerate(self.nodes):
+            p = patterns.get(n.name, n.demandPattern)
+            if p is not None:
+                series[i] = np.asarray(p, dtype=float).ravel()
+        if nSteps is None:
+            nSteps = max([len(p) for p in series.values()], default=1)
+        demand = np.tile(self.extFlow, (nSteps, 1))
+        for i, p in series.items():
+            demand[:, i] = np.resize(p, nSteps)  # repeat a short pattern
+        nP = len(self.pipes)
+        times = timestep * np.arange(nSteps)
+        report = {'time': times, 'iterations': np.zeros(nSteps, dtype=int), 'converged': np.zeros(nSteps, dtype=bool),
+                  'residual': np.zeros(nSteps)}
+        csvFile = None
+        if filename is None:
+            flows = report['flows'] = np.zeros((nSteps, nP))
+        elif filename.lower().endswith('.csv'):
+            flows = None
+            csvFile = open(filename, 'w', newline='')
+            writer = csv.writer(csvFile)
+            writer.writerow(['step', 'time'] + [p.Name() for p in self.pipes])
+        else:
+            flows = np.lib.format.open_memmap(filename, mode='w+', dtype=float, shape=(nSteps, nP))
+        try:
+            for step in range(nSteps):
+                self.extFlow = demand[step].copy()
+                if method == 'gga':
+                    q = self.ggaFlowRates(self.Q, tol, maxiter, friction, transition, compile=False)
+                else:
+                    q = self.newtonFlowRates(self.Q, tol, maxiter, friction, transition, compile=False)
+                report['iterations'][step] = self.solverReport['iterations']
+                report['converged'][step] = self.solverReport['converged']
+                report['residual'][step] = self.solverReport['residual']
+                if csvFile is None:
+                    flows[step] = q
+                else:
+                    writer.writerow([step, times[step]] + q.tolist())
+        finally:
+            if csvFile is not None:
+                csvFile.close()
+            elif filename is not None:
+                flows.flush()
+                del flows
+        return report
+
+    def transitionEnsemble(self, nSamples=100, sigma=0.2, seed=None, processes=None, friction='colebrook',
+                           transition='smooth', tol=1e-8, maxiter=50, percentiles=(5, 50, 95)):
+        '''
+        Uncertainty analysis of the transition regime: the friction factor of pipes with 2000 < Re < 4000 is
+        uncertain, so each sample draws one standard normal value per pipe (see FrictionFactor.transitionNoise)
+        and solves the network with those draws held fixed, which keeps every solve deterministic.  The draws
+        come from one seeded generator in this process, so results do not depend on the number of workers.
+        Samples are solved across a process pool, each warm started from the nominal flows.  The pipe flows are
+        left at the nominal solution.
+        :param nSamples: number of samples
+        :param sigma: relative standard deviation of the friction factor at the middle of the transition band
+        :param seed: seed for the draws
+        :param processes: number of worker processes (default os.cpu_count(), 1 solves in this process)
+        :param friction: turbulent friction factor method or FrictionTable, see newtonFlowRates
+        :param transition: transition blend, see FrictionFactor.frictionFactor
+        :param tol: convergence tolerance of each solve
+        :param maxiter: iteration limit of each solve
+        :param percentiles: percentiles of each flow to report
+        :return: a dictionary with 'nominal', 'flows' (nSamples, nPipes) in L/s, 'mean', 'std', 'min', 'max',
+                 'percentiles' {p: array}, 'converged' (bool per sample) and 'noise' (the draws)
+        '''
+        nominal = self.newtonFlowRates(tol=tol, maxiter=maxiter, friction=friction, transition=transition)
+        noise = np.random.default_rng(seed).standard_normal((nSamples, len(self.pipes)))
+        settings = (self, nominal, friction, transition, sigma, tol, maxiter)
+        if processes == 1:
+            setEnsembleNetwork(*settings)
+            results = [solveEnsembleSample(z) for z in noise]
+        else:
+            with Pool(processes, initializer=setEnsembleNetwork, initargs=settings) as pool:
+                workers = processes or os.cpu_count()
+                results = pool.map(solveEnsembleSample, noise, chunksize=max(1, nSamples // (4 * workers)))
+        self.setFlowRates(nominal)
+        flows = np.array([q for q, ok in results]).reshape(nSamples, len(self.pipes))
+        return {'nominal': nominal, 'flows': flows, 'mean': flows.mean(axis=0), 'std': flows.std(axis=0),
+                'min': flows.min(axis=0), 'max': flows.max(axis=0),
+                'percentiles': {p: np.percentile(flows, p, axis=0) for p in percentiles},
+                'converged': np.array([ok for q, ok in results], dtype=bool), 'noise': noise}
+
+    def setFlowRates(self, q):
+        '''
+        Sets the flow rate of every pipe, in self.pipes order, and the compiled array self.Q.
+        :param q: array of flow rates in L/s
+        :return: nothing
+        '''
+        self.Q = np.array(q, dtype=float)
+        for p, qi in zip(self.pipes, self.Q.tolist()):
+            p.Q = qi
+
+    def getNodeFlowRates(self, q=None):
         '''
-        Retrieves net flow rates at each node.
+        Retrieves net flow rates at each node, as one sparse incidence mat-vec.  The network is compiled only if
+        its topology is stale (see ensureCompiled), so the external flows are those of the last compile.
+        :param q: array of pipe flow rates in L/s (default: the current flows of the pipes)
         :return: list of net flow rates
         '''
-        return [n.getNetFlowRate() for n in self.nodes]
-        # each node object is responsible for calculating its own net flow rate
+        self.ensureCompiled()
+        if q is None:
+            q = np.fromiter((p.Q for p in self.pipes), dtype=float, count=len(self.pipes))
+        return list(self.incidence @ np.asarray(q, dtype=float) + self.extFlow)
 
     def getLoopHeadLosses(self):
         '''
-        Retrieves net head loss for each loop.
+        Retrieves net head loss for each loop, with the friction method and transition blend of the last solve.
         :return: list of head losses
         '''
-        lhl =  [l.getLoopHeadLoss() for l in self.loops]
+        lhl =  [l.getLoopHeadLoss(self.friction, self.transition) for l in self.loops]
         return lhl
         # each loop object is responsible for calculating its own net head loss
 
@@ -79,11 +949,11 @@ class PipeNetwork():
         '''
         Retrieves a pipe object by its name.
         :param name: pipe name
-        :return: Pipe object by name
+        :return: Pipe object by name (None if there is none)
         '''
-        for p in self.pipes:
-            if name == p.Name():
-                return p
+        self.updateIndex()
+        k = self.pipeIndex.get(name)
+        return None if k is None else self.pipes[k]
 
     def getNodePipes(self, node):
         '''
@@ -91,12 +961,8 @@ class PipeNetwork():
         :param node: node name
         :return: list of Pipe objects
         '''
-        # returns a list of pipe objects that are connected to the node object
-        l = []
-        for p in self.pipes:
-            if p.oContainsNode(node):
-                l.append(p)
-        return l
+        self.updateIndex()
+        return [self.pipes[k] for k in self.nodePipes.get(node, [])]
 
     def nodeBuilt(self, node):
         '''
@@ -104,33 +970,325 @@ class PipeNetwork():
         :param node: node name
         :return: True if exists, False otherwise
         '''
-        for n in self.nodes:
-            if n.name == node:
-                return True
-        return False
+        self.updateIndex()
+        return node in self.nodeIndex
 
     def getNode(self, name):
         '''
         Retrieves a node object by name.
         :param name: node name
-        :return: one of the node objects by name
+        :return: one of the node objects by name (None if there is none)
         '''
-        for n in self.nodes:
-            if n.name == name:
-                return n
+        self.updateIndex()
+        k = self.nodeIndex.get(name)
+        return None if k is None else self.nodes[k]
 
     def buildNodes(self):
         '''
-        Automatically creates node objects by checking the pipe endpoints.
+        Automatically creates node objects by checking the pipe endpoints, in order of first appearance.
+        Nodes that already exist are kept.  One pass over the pipes.
         '''
-        # automatically create the node objects by looking at the pipe ends
+        self.updateIndex()
         for p in self.pipes:
-            if self.nodeBuilt(p.startNode) == False:
-                # instantiate a node object and append it to the list of nodes
-                self.nodes.append(Node(p.startNode, self.getNodePipes(p.startNode)))
-            if self.nodeBuilt(p.endNode) == False:
-                # instantiate a node object and append it to the list of nodes
-                self.nodes.append(Node(p.endNode, self.getNodePipes(p.endNode)))
+            for name in (p.startNode, p.endNode):
+                if name not in self.nodeIndex:
+                    self.nodes.append(Node(name, [self.pipes[k] for k in self.nodePipes[name]]))
+                    self.nodeIndex[name] = len(self.nodes) - 1
+
+    def buildNetworkFromFile(self, filename, cache=False):
+        '''
+        Replaces the network with one read from a sectioned text file in the spirit of EPANET .inp files.  Lines
+        starting with # or ; are comments, a line [NAME] starts a section and every other line is one record of
+        whitespace separated fields:
+            [PIPES]       start end length(m) diameter(mm) [roughness(m)]
+            [JUNCTIONS]   node extFlow(L/s) [pattern [base(L/s)]]
+            [RESERVOIRS]  node head(m)
+            [PATTERNS]    pattern multiplier multiplier ...  (more lines with the same name extend it)
+            [OPTIONS]     key value, with keys roughness (default for pipes, 0.00025 m), viscosity (Pa*s) and
+                          density (kg/m^3)
+        A junction with a pattern gets the demand pattern base*multiplier (see Node.demandPattern), with the base
+        demand defaulting to extFlow.  Nodes
+        are made from the pipe ends in order of first appearance, and nodes that are not listed are junctions
+        with no external flow.  Loops are not part of the file; the solvers find them when they are needed.
+        :param filename: the network file
+        :param cache: if True, reuse (or write) a compiled binary copy of the network next to the file so that
+                      reloading an unchanged file skips the text parsing
+        :return: nothing
+        '''
+        if cache and self.loadNetworkCache(filename):
+            return
+        self.parseNetworkFile(filename)
+        if cache:
+            self.saveNetworkCache(filename)
+
+    def parseNetworkFile(self, filename):
+        '''
+        Reads a network file (see buildNetworkFromFile) in a single streaming pass, one line at a time.  Pipes are
+        appended as they are read; node records and patterns are kept by name and applied once all pipes are
+        known, so sections may come in any order.
+        :param filename: the network file
+        :return: nothing
+        '''
+        self.pipes, self.nodes, self.loops = [], [], []
+        self.pipeIndex, self.nodeIndex, self.nodePipes = {}, {}, {}
+        self.compiledSize = None
+        options = {'roughness': 0.00025, 'viscosity': self.Fluid.mu, 'density': self.Fluid.rho}
+        junctions, reservoirs, patterns = {}, {}, {}
+        pipeData = []  # (start, end, length, diameter, roughness or None) until the fluid is known
+        section = None
+        with open(filename, 'r') as f:
+            for LineNum, line in enumerate(f, 1):
+                fields = line.split()
+                if len(fields) == 0 or fields[0][0] in '#;':
+                    continue
+                if fields[0][0] == '[':
+                    section = line.strip()[1:-1].strip().lower()
+                    if line.strip()[-1] != ']' or section not in ('pipes', 'junctions', 'reservoirs', 'patterns',
+                                                                  'options'):
+                        raise ValueError("{} line {}: unknown section {}".format(filename, LineNum, line.strip()))
+                    continue
+                try:
+                    if section == 'pipes' and len(fields) in (4, 5):
+                        pipeData.append((fields[0], fields[1], float(fields[2]), float(fields[3]),
+                                         float(fields[4]) if len(fields) == 5 else None))
+                    elif section == 'junctions' and len(fields) in (2, 3, 4):
+                        ext = float(fields[1])
+                        junctions[fields[0]] = (ext, fields[2] if len(fields) > 2 else None,
+                                                float(fields[3]) if len(fields) == 4 else ext)
+                    elif section == 'reservoirs' and len(fields) == 2:
+                        reservoirs[fields[0]] = float(fields[1])
+                    elif section == 'patterns' and len(fields) > 1:
+                        patterns.setdefault(fields[0], []).extend(float(v) for v in fields[1:])
+                    elif section == 'options' and len(fields) == 2 and fields[0].lower() in options:
+                        options[fields[0].lower()] = float(fields[1])
+                    else:
+                        raise ValueError
+                except ValueError:
+                    raise ValueError("{} line {}: bad {} record '{}'".format(filename, LineNum, section,
+                                                                             line.strip())) from None
+        self.Fluid = Fluid(options['viscosity'], options['density'])
+        for start, end, L, D, r in pipeData:
+            self.pipes.append(Pipe(start, end, L, D, options['roughness'] if r is None else r, self.Fluid))
+        self.buildNodes()
+        for name in list(junctions) + list(reservoirs):
+            if name not in self.nodeIndex:
+                raise ValueError("{}: node {} is not connected to any pipe".format(filename, name))
+        for name, (ext, pattern, base) in junctions.items():
+            node = self.nodes[self.nodeIndex[name]]
+            node.extFlow = ext
+            if pattern is not None:
+                if pattern not in patterns:
+                    raise ValueError("{}: junction {} uses unknown pattern {}".format(filename, name, pattern))
+                node.demandPattern = base * np.array(patterns[pattern])
+        for name, head in reservoirs.items():
+            node = self.nodes[self.nodeIndex[name]]
+            node.fixedHead = node.head = head
+
+    def writeNetworkFile(self, filename):
+        '''
+        Writes the network in the format read by buildNetworkFromFile.  Each demand pattern is written as a
+        pattern of its own named after the node, as multipliers of extFlow or, when extFlow is zero, of a base of
+        1 L/s.
+        :param filename: the network file to write
+        :return: nothing
+        '''
+        self.buildNodes()
+        with open(filename, 'w') as f:
+            f.write('[OPTIONS]\nviscosity {}\ndensity {}\n'.format(float(self.Fluid.mu), float(self.Fluid.rho)))
+            f.write('\n[PIPES]\n# start end length(m) diameter(mm) roughness(m)\n')
+            for p in self.pipes:
+                f.write('{} {} {} {} {}\n'.format(p.startNode, p.endNode, float(p.length), float(p.d * 1000.0),
+                                                  float(p.r)))
+            f.write('\n[JUNCTIONS]\n# node extFlow(L/s) pattern base(L/s)\n')
+            patterns = []
+            for n in self.nodes:
+                if n.fixedHead is not None:
+                    continue
+                if n.demandPattern is not None:
+                    base = float(n.extFlow) if n.extFlow != 0 else 1.0
+                    patterns.append((n.name, np.asarray(n.demandPattern, dtype=float).ravel() / base))
+                    f.write('{} {} {} {}\n'.format(n.name, float(n.extFlow), n.name, base))
+                elif n.extFlow != 0:
+                    f.write('{} {}\n'.format(n.name, float(n.extFlow)))
+            f.write('\n[RESERVOIRS]\n# node head(m)\n')
+            for n in self.nodes:
+                if n.fixedHead is not None:
+                    f.write('{} {}\n'.format(n.name, float(n.fixedHead)))
+            f.write('\n[PATTERNS]\n# pattern multipliers\n')
+            for name, m in patterns:
+                f.write('{} {}\n'.format(name, ' '.join(str(v) for v in m.tolist())))
+
+    def getCachePath(self, filename):
+        '''
+        :param filename: network file name
+        :return: name of the compiled binary cache for that network file
+        '''
+        return filename + '.cache.npz'
+
+    def getFileHash(self, filename):
+        '''
+        Hashes a file in fixed size chunks.
+        :param filename: file to hash
+        :return: sha1 hex digest of the file contents
+        '''
+        h = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def saveNetworkCache(self, filename, sha1=None):
+        '''
+        Writes the network to a compiled binary (.npz) cache keyed by the network file's mtime, size and hash.
+        The loops are cached too, so calling this again after findLoops saves finding them on the next load (the
+        cache stays valid as long as the network file is unchanged).
+        :param filename: the network file the network was read from
+        :param sha1: the network file's hash if it is already known (it is computed otherwise)
+        :return: nothing
+        '''
+        st = os.stat(filename)
+        sha1 = self.getFileHash(filename) if sha1 is None else sha1
+        self.compileNetwork()
+        patterns = [n.demandPattern for n in self.nodes]
+        ptr = np.cumsum([0] + [0 if p is None else np.size(p) for p in patterns])
+        values = np.concatenate([np.ravel(p) for p in patterns if p is not None] + [np.zeros(0)])
+        loopPtr = np.cumsum([0] + [len(l.pipes) for l in self.loops])
+        col = {id(p): j for j, p in enumerate(self.pipes)}
+        loopPipes = np.array([col[id(p)] for l in self.loops for p in l.pipes], dtype=np.intp)
+        try:
+            with open(self.getCachePath(filename), 'wb') as f:
+                np.savez(f, version=CACHE_VERSION, mtime=st.st_mtime_ns, size=st.st_size,
+                         sha1=sha1, fluid=np.array([self.Fluid.mu, self.Fluid.rho]),
+                         node_names=np.array([n.name for n in self.nodes], dtype=str),
+                         pipe_start=self.pipeStart, pipe_end=self.pipeEnd, L=self.L, D=self.D * 1000.0,
+                         roughness=self.roughness, ext_flow=self.extFlow, fixed_head=self.fixedHead,
+                         pattern_ptr=ptr, pattern_values=values,
+                         has_pattern=np.array([p is not None for p in patterns], dtype=bool),
+                         loop_names=np.array([l.name for l in self.loops], dtype=str), loop_ptr=loopPtr,
+                         loop_pipes=loopPipes)
+        except OSError as e:
+            warnings.warn("Could not write network cache: {}".format(e))
+
+    def loadNetworkCache(self, filename):
+        '''
+        Replaces the network with the compiled cache if it exists and still matches the network file.
+        The cache is valid if the file's mtime and size are unchanged, or failing that, if its hash is unchanged.
+        :param filename: the network file
+        :return: True if the network was loaded from the cache, False otherwise
+        '''
+        path = self.getCachePath(filename)
+        if not os.path.exists(path):
+            return False
+        st = os.stat(filename)
+        with np.load(path, allow_pickle=False) as c:
+            if int(c['version']) != CACHE_VERSION:
+                return False
+            sha1 = None  # set when the file had to be hashed to match the cache
+            if (int(c['mtime']), int(c['size'])) != (st.st_mtime_ns, st.st_size):
+                sha1 = self.getFileHash(filename)
+                if str(c['sha1']) != sha1:
+                    return False
+            self.Fluid = Fluid(*c['fluid'].tolist())
+            self.compiledSize = None
+            names = c['node_names'].tolist()
+            self.pipes = [Pipe(names[a], names[b], L, D, r, self.Fluid) for a, b, L, D, r in zip(
+                c['pipe_start'].tolist(), c['pipe_end'].tolist(), c['L'].tolist(), c['D'].tolist(),
+                c['roughness'].tolist())]
+            # index the pipes by node with one sort rather than a pass of dictionary appends (see updateIndex)
+            start, end = c['pipe_start'], c['pipe_end']
+            nP, nN = len(self.pipes), len(names)
+            loop = end != start  # a pipe from a node to itself is listed once
+            ends = np.concatenate((start, end[loop]))
+            pipe = np.concatenate((np.arange(nP), np.flatnonzero(loop)))
+            order = np.lexsort((pipe, ends))
+            bounds = np.searchsorted(ends[order], np.arange(nN + 1)).tolist()
+            byNode = pipe[order].tolist()
+            self.pipeIndex = dict(zip([p.Name() for p in self.pipes], range(nP)))
+            self.nodePipes = {names[k]: byNode[bounds[k]:bounds[k + 1]] for k in range(nN)
+                              if bounds[k + 1] > bounds[k]}
+            self.nodeIndex = dict(zip(names, range(nN)))
+            ptr, pipes = c['loop_ptr'].tolist(), c['loop_pipes'].tolist()
+            self.loops = [Loop(name, [self.pipes[j] for j in pipes[ptr[k]:ptr[k + 1]]])
+                          for k, name in enumerate(c['loop_names'].tolist())]
+            ptr, values = c['pattern_ptr'].tolist(), c['pattern_values']
+            held = ~np.isnan(c['fixed_head'])
+            self.nodes = [Node(name, [self.pipes[j] for j in byNode[bounds[k]:bounds[k + 1]]], ext,
+                               head if fix else None, values[ptr[k]:ptr[k + 1]].copy() if has else None)
+                          for k, (name, ext, head, fix, has) in enumerate(zip(
+                              names, c['ext_flow'].tolist(), c['fixed_head'].tolist(), held.tolist(),
+                              c['has_pattern'].tolist()))]
+        if sha1 is not None:
+            self.saveNetworkCache(filename, sha1)  # store the new mtime, so later loads skip the hash again
+        return True
+
+    def findLoops(self):
+        '''
+        Replaces self.loops with a minimal set of independent loops found from the pipe topology.
+        A breadth first spanning tree is grown over the nodes, and each pipe not in the tree closes exactly one
+        loop through the tree.  That gives (pipes - nodes + connected parts) loops, so the loop equations are
+        independent, and the breadth first tree keeps the loops short.
+        :return: the list of loops
+        '''
+        names = sorted(set([p.startNode for p in self.pipes] + [p.endNode for p in self.pipes]))
+        index = {n: k for k, n in enumerate(names)}
+        ends = [(index[p.startNode], index[p.endNode]) for p in self.pipes]
+        self.loops = []
+        for cNodes, cPipes in self.getCycleBasis(len(names), ends):
+            # each cycle starts at the start node of its first pipe, where Loop traversal begins
+            self.loops.append(Loop('L{}'.format(len(self.loops) + 1), [self.pipes[k] for k in cPipes]))
+        return self.loops
+
+    def getCycleBasis(self, nNodes, ends):
+        '''
+        Finds the fundamental cycles of a graph with respect to a breadth first spanning forest.  Each cycle
+        starts at the first end of the edge that closes it.  P1's ResistorNetwork.GetCycleBasis is the same
+        routine, copied on purpose because the two projects do not share code.
+        :param nNodes: number of nodes
+        :param ends: list of (node index, node index) for each edge
+        :return: a list of cycles, each a tuple of (node indices in traversal order, edge indices in traversal order)
+        '''
+        adj = [[] for n in range(nNodes)]
+        for k, (a, b) in enumerate(ends):
+            adj[a].append((b, k))
+            adj[b].append((a, k))
+        depth = [-1] * nNodes
+        parent = [-1] * nNodes
+        parentEdge = [-1] * nNodes
+        inTree = [False] * len(ends)
+        for root in range(nNodes):
+            if depth[root] >= 0:
+                continue
+            depth[root] = 0
+            queue = deque([root])
+            while queue:
+                a = queue.popleft()
+                for b, k in adj[a]:
+                    if depth[b] < 0:
+                        depth[b] = depth[a] + 1
+                        parent[b] = a
+                        parentEdge[b] = k
+                        inTree[k] = True
+                        queue.append(b)
+        cycles = []
+        for k, (u, v) in enumerate(ends):
+            if inTree[k] or u == v:
+                continue
+            # climb from both ends of the chord to their common ancestor
+            a, b = u, v
+            pathA, pathB, edgesA, edgesB = [u], [v], [], []
+            while a != b:
+                if depth[a] >= depth[b]:
+                    edgesA.append(parentEdge[a])
+                    a = parent[a]
+                    pathA.append(a)
+                else:
+                    edgesB.append(parentEdge[b])
+                    b = parent[b]
+                    pathB.append(b)
+            # u -> v across the chord, up from v to the ancestor, then back down to u
+            cycles.append(([u] + pathB[:-1] + pathA[:0:-1], [k] + edgesB + edgesA[::-1]))
+        return cycles
+
     #this region prints outputs to user for FR, Net Flow, & hl
     def printPipeFlowRates(self):
         '''
@@ -151,4 +1309,45 @@ class PipeNetwork():
         Prints head loss for each loop.
         '''
         for l in self.loops:
-            print('Head loss for loop {} is {:0.2f} m'.format(l.name, l.getLoopHeadLoss()))
+            hl = l.getLoopHeadLoss(self.friction, self.transition)
+            print('Head loss for loop {} is {:0.2f} m'.format(l.name, hl))
+
+#region function definitions
+def solveZone(job):
+    '''
+    Solves one zone of PipeNetwork.decomposedFlowRates.
+    :param job: (zone network, method, tol, maxiter, friction, transition)
+    :return: (flow rates in L/s, heads in m or None for 'newton', convergence report)
+    '''
+    net, method, tol, maxiter, friction, transition = job
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        if method == 'gga':
+            q = net.ggaFlowRates(tol=tol, maxiter=maxiter, friction=friction, transition=transition)
+            return q, net.H, net.solverReport
+        q = net.newtonFlowRates(tol=tol, maxiter=maxiter, friction=friction, transition=transition)
+        return q, None, net.solverReport
+
+ensembleState = {}  # the network and solve settings of an ensemble worker process
+
+def setEnsembleNetwork(network, Q0, friction, transition, sigma, tol, maxiter):
+    '''
+    Pool initializer for PipeNetwork.transitionEnsemble: keeps the network and settings in the worker, so they
+    are sent once per process rather than once per sample.
+    '''
+    ensembleState.update(network=network, Q0=Q0, friction=friction, transition=transition, sigma=sigma, tol=tol,
+                         maxiter=maxiter)
+
+def solveEnsembleSample(noise):
+    '''
+    Solves the ensemble network for one sample of transition draws.
+    :param noise: standard normal draw for each pipe
+    :return: (flow rates in L/s, converged)
+    '''
+    s = ensembleState
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        q = s['network'].newtonFlowRates(s['Q0'], s['tol'], s['maxiter'], s['friction'], s['transition'], noise,
+                                         s['sigma'])
+    return q, s['network'].solverReport['converged']
+#endregion
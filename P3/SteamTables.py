@@ -0,0 +1,140 @@
+# region imports
+import os
+import warnings
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator
+# endregion
+
+# region function definitions
+# Process-wide registry of the steam tables and of the interpolators built on them.  Each table is parsed, and each
+# interpolator built, the first time it is asked for and then shared by every steam object in the process, so
+# building a state does no file I/O and no triangulation.
+# Table files are looked up in the directory set by setTableDirectory, else in the directory named by the
+# STEAM_TABLE_DIR environment variable, else next to this module.  A parsed table is also kept as a binary .npy
+# file next to its text file (when the directory is writable) and later processes memory-map that instead of
+# parsing the text again, for as long as the text file is not newer.
+TABLE_FILES = {'saturated': 'sat_water_table.txt', 'superheated': 'superheated_water_table.txt'}
+SUPERHEATED_COLUMNS = ('T', 'h', 's')  # columns of the superheated table before p
+tableRegistry = {}  # table or interpolator name -> table, array or interpolator, filled on first use
+tableSettings = {'directory': None, 'cache': True}
+
+def setTableDirectory(directory=None, cache=True):
+    '''
+    Sets where the table files are found and clears the registry, so the tables are read again from there.
+    :param directory: directory of the table files (None for STEAM_TABLE_DIR or the directory of this module)
+    :param cache: keep and use .npy copies of the parsed tables
+    :return: nothing
+    '''
+    tableSettings['directory'] = directory
+    tableSettings['cache'] = cache
+    tableRegistry.clear()
+
+def getTablePath(name):
+    '''
+    :param name: table name, a key of TABLE_FILES
+    :return: path of the table's text file
+    '''
+    directory = tableSettings['directory'] or os.environ.get('STEAM_TABLE_DIR') or \
+        os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(directory, TABLE_FILES[name])
+
+def parseTable(filename):
+    '''
+    Parses a whitespace separated table with one header line.
+    :param filename: the text file
+    :return: 2-D array with one row per line of the table
+    '''
+    # np.genfromtxt with filling turns a column seen as empty (from the table formatting) into NaN values.  The
+    # saturated table has 8 columns rather than the 9 it seems to have, and skipping the header line also skips
+    # the column names (T, p, hf, hg, vf, vg, etc.).
+    return np.genfromtxt(
+        filename,
+        delimiter=None,  #reads spaces and tabs
+        skip_header=1,  #skips header to avoid reading non-numeric values
+        dtype=float,  #reads float-numeric type data
+        invalid_raise=False,  #allows rows with missing values to fill w/ Nan
+        filling_values=np.nan  # replaces the missing values with NaN
+    )
+
+def loadTable(name):
+    '''
+    Reads a table from its .npy cache if that is up to date, otherwise parses the text file (and writes the
+    cache if caching is on).
+    :param name: table name, a key of TABLE_FILES
+    :return: 2-D array of the table (read-only when memory-mapped from the cache)
+    '''
+    filename = getTablePath(name)
+    cacheName = os.path.splitext(filename)[0] + '.npy'
+    useCache = tableSettings['cache']
+    if useCache and os.path.exists(cacheName) and os.path.getmtime(cacheName) >= os.path.getmtime(filename):
+        try:
+            return np.load(cacheName, mmap_mode='r', allow_pickle=False)
+        except (OSError, ValueError):
+            pass  # a damaged cache is parsed again and rewritten
+    table = parseTable(filename)
+    if useCache:
+        try:
+            np.save(cacheName, table)
+        except OSError as e:
+            warnings.warn("Could not write steam table cache: {}".format(e))
+    return table
+
+def getTable(name):
+    '''
+    The named table, parsed (or loaded from its cache) on first use and shared afterwards.
+    :param name: 'saturated' (columns T in C, p in bar, hf, hg, sf, sg, vf, vg) or 'superheated' (columns T in
+                 C, h, s, p in kPa)
+    :return: 2-D array of the table
+    '''
+    table = tableRegistry.get(name)
+    if table is None:
+        table = tableRegistry[name] = loadTable(name)
+    return table
+
+def getSaturatedSlopes():
+    '''
+    The saturated table sorted by pressure with the slope of every column over each pressure interval, for
+    saturatedProperties.
+    :return: (p in bar, columns T, hf, hg, sf, sg, vf, vg, slopes per bar) arrays
+    '''
+    entry = tableRegistry.get('saturated slopes')
+    if entry is None:
+        table = np.array(getTable('saturated'))
+        table = table[np.argsort(table[:, 1], kind='stable')]
+        xp, fp = table[:, 1], np.delete(table, 1, axis=1)
+        entry = tableRegistry['saturated slopes'] = (xp, fp, np.diff(fp, axis=0) / np.diff(xp)[:, None])
+    return entry
+
+def saturatedProperties(pbar):
+    '''
+    Saturation properties by linear interpolation in pressure, for all seven columns with one search.  This is
+    np.interp on each column (and griddata on the 1-D table, which it replaces) with nan outside the table.
+    :param pbar: pressure in bar, a scalar or an array
+    :return: array of Tsat (C), hf, hg (kJ/kg), sf, sg (kJ/(kg K)), vf, vg (m^3/kg) along the last axis
+    '''
+    xp, fp, slope = getSaturatedSlopes()
+    x = np.asarray(pbar, dtype=float)
+    j = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, len(xp) - 2)
+    x = x[..., None]
+    f = slope[j] * (x - xp[j][..., None]) + fp[j]
+    f = np.where(x == xp[-1], fp[-1], f)  # the last point is exact, as in np.interp
+    return np.where((x < xp[0]) | (x > xp[-1]) | np.isnan(x), np.nan, f)
+
+def getSuperheatedInterpolator(given):
+    '''
+    Linear interpolator over the superheated table from (given, p in kPa) to the other two of T, h and s.  It is
+    built once on the same Delaunay triangulation that griddata builds on every call, so the values are the
+    same as griddata's.
+    :param given: 'T', 'h' or 's'
+    :return: (LinearNDInterpolator returning the two other properties along the last axis, their names)
+    '''
+    key = 'superheated ' + given
+    entry = tableRegistry.get(key)
+    if entry is None:
+        table = np.array(getTable('superheated'))
+        k = SUPERHEATED_COLUMNS.index(given)
+        others = [c for c in range(3) if c != k]
+        entry = tableRegistry[key] = (LinearNDInterpolator(table[:, [k, 3]], table[:, others]),
+                                      tuple(SUPERHEATED_COLUMNS[c] for c in others))
+    return entry
+# endregion
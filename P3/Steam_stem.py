@@ -1,6 +1,6 @@
 # region imports
 import numpy as np
-from scipy.interpolate import griddata
+from SteamTables import saturatedProperties, getSuperheatedInterpolator
 # endregion
 
 #region class
@@ -46,57 +46,20 @@ class steam():
         :return: nothing returned, just set the properties
         '''
 
-        #load saturated water table
-        """I used np.genfromtxt with delimiter and filling to fill a column recognized as empty by pycharm with NaN values
-         as a recommended solution from ChatGPT due to formatting issues from the text files. 
-        It happened to expect 9 columns, but receive 8 for sat_water, this also resolves the issue by skipping the 
-         column headers (T, p, hf, hg, vf, vg, etc.)."""
-        sat_data = np.genfromtxt(
-            "C:/Users/justi/PycharmProjects/HW6/P3/sat_water_table.txt",
-            delimiter=None,  #reads spaces and tabs
-            skip_header=1, #skips header to avoid reading non-numeric values
-            dtype=float, #reads float-numeric type data
-            invalid_raise=False,  #allows rows with missing values to fill w/ Nan
-            filling_values=np.nan  # replaces the missing values with NaN
-        )
-
-        #load superheated water table
-        sh_data = np.genfromtxt(
-            "C:/Users/justi/PycharmProjects/HW6/P3/superheated_water_table.txt",
-            #although in same HW6 folder, I still called the path directly
-            delimiter=None, #read spaces and tabs
-            skip_header=1, #header skip
-            dtype=float, #recognize float data types
-            invalid_raise=False, #allow empty columns
-            filling_values=np.nan #replace empty w/ NaN
-        )
-
-        #assign columns for saturated data so sat_data.T
-        ts, ps, hfs, hgs, sfs, sgs, vfs, vgs = sat_data.T
-
-        #assign columns for superheated data
-        tcol, hcol, scol, pcol = sh_data.T
-
+        #the tables and their interpolators are built once per process and shared by every state (see SteamTables)
         R = 8.314 / (18 / 1000)  #ideal gas constant for water [J/(mol K)]/[kg/mol]
         Pbar = self.p / 100  #convert pressure (kpa) to bar
 
-        #use griddata to interpolate for saturated properties to find exact value for each column (argument) in sat_water
-        Tsat = float(griddata(ps, ts, Pbar, method='linear'))
-        hf = float(griddata(ps, hfs, Pbar, method='linear'))
-        hg = float(griddata(ps, hgs, Pbar, method='linear'))
-        sf = float(griddata(ps, sfs, Pbar, method='linear'))
-        sg = float(griddata(ps, sgs, Pbar, method='linear'))
-        vf = float(griddata(ps, vfs, Pbar, method='linear'))
-        vg = float(griddata(ps, vgs, Pbar, method='linear'))
+        #interpolate in pressure for all the saturated properties at once
+        Tsat, hf, hg, sf, sg, vf, vg = saturatedProperties(Pbar).tolist()
 
         self.hf = hf  #creating member variable for the class that can be accessed from an object for enthalpy
 
         #find which of the second properties are given
         if self.T is not None:
-            if self.T > Tsat:  #interpolate with griddata
+            if self.T > Tsat:  #interpolate in the superheated table with T & P
                 self.region = 'Superheated'
-                self.h = float(griddata((tcol, pcol), hcol, (self.T, self.p), method='linear'))
-                self.s = float(griddata((tcol, pcol), scol, (self.T, self.p), method='linear'))
+                self.h, self.s = getSuperheatedInterpolator('T')[0](self.T, self.p).tolist()
                 self.x = 1.0 #assign at x1=1
                 TK = self.T + 273.14  #temperature conversion to kelvin
                 self.v = R * TK / (self.p * 1000)  #finds ideal gas approximation for the volume
@@ -113,10 +76,9 @@ class steam():
                 self.T = Tsat
                 self.s = sf + self.x * (sg - sf)
                 self.v = vf + self.x * (vg - vf)
-            else:  #interpolate by using griddata in SHV
+            else:  #interpolate in the superheated table with h & P
                 self.region = 'Superheated'
-                self.T = float(griddata((hcol, pcol), tcol, (self.h, self.p), method='linear'))
-                self.s = float(griddata((hcol, pcol), scol, (self.h, self.p), method='linear'))
+                self.T, self.s = getSuperheatedInterpolator('h')[0](self.h, self.p).tolist()
         elif self.s is not None:
             self.x = (self.s - sf) / (sg - sf)
             if self.x <= 1.0:  #manual interpolation
@@ -124,12 +86,9 @@ class steam():
                 self.T = Tsat
                 self.h = hf + self.x * (hg - hf)
                 self.v = vf + self.x * (vg - vf)
-            else:  #interpolate with griddata for SHV
+            else:  #interpolate in the superheated table with s & P
                 self.region = 'Superheated'
-                self.T = float(griddata((scol, pcol), tcol, (self.s, self.p), method='linear'))
-                #use griddata to interpolate with s & P the superheated table
-                self.h = float(griddata((scol, pcol), hcol, (self.s, self.p), method='linear'))
-                #use griddata to interpolate with s & P the superheated table
+                self.T, self.h = getSuperheatedInterpolator('s')[0](self.s, self.p).tolist()
         #endregion
 
     def print(self):
@@ -157,6 +116,67 @@ class steam():
 # endregion
 
 # region function definitions
+SATURATED, SUPERHEATED = 1, 2  # region codes of steamStates (0 where steam.calc leaves the region unset)
+REGION_NAMES = {0: None, SATURATED: 'Saturated', SUPERHEATED: 'Superheated'}
+
+def steamStates(pressure, T=None, x=None, h=None, s=None):
+    '''
+    Vectorized steam.calc: the properties of many states at once, as arrays rather than steam objects.  The
+    regions are found with boolean masks and each property is computed the same way as in steam.calc, so
+    every element equals the steam object of the same inputs (nan where steam.calc leaves a property None,
+    e.g. v in the superheated region given h or s, or everything but T when a given T is not above Tsat).
+    :param pressure: pressures in kPa, an array or scalar broadcast against the given property
+    :param T: Temperatures in degrees C
+    :param x: qualities
+    :param h: specific enthalpies in kJ/kg
+    :param s: specific entropies in kJ/(kg*K)
+    :return: a dictionary of arrays of the broadcast shape: 'p', 'T', 'h', 's', 'v', 'x', 'hf' and 'region'
+             (SATURATED, SUPERHEATED or 0, see REGION_NAMES)
+    '''
+    given = [(k, v) for k, v in (('T', T), ('x', x), ('h', h), ('s', s)) if v is not None]
+    if len(given) != 1:
+        raise ValueError("steamStates needs exactly one of T, x, h or s")
+    name, value = given[0]
+    p, value = np.broadcast_arrays(np.asarray(pressure, dtype=float), np.asarray(value, dtype=float))
+    R = 8.314 / (18 / 1000)  #ideal gas constant for water [J/(mol K)]/[kg/mol]
+    Tsat, hf, hg, sf, sg, vf, vg = np.moveaxis(saturatedProperties(p / 100), -1, 0)
+    states = {k: np.full(p.shape, np.nan) for k in ('T', 'h', 's', 'v', 'x')}
+    states[name] = value.copy()
+    region = np.zeros(p.shape, dtype=np.int8)
+
+    #classify the states as steam.calc does, by temperature or by the quality of the given property
+    if name == 'T':
+        sat = np.zeros(p.shape, dtype=bool)
+        sup = value > Tsat
+        states['x'][sup] = 1.0
+        states['v'][sup] = R * (value[sup] + 273.14) / (p[sup] * 1000)  #ideal gas approximation
+    elif name == 'x':
+        sat = np.ones(p.shape, dtype=bool)
+        sup = ~sat
+    else:
+        f, g = (hf, hg) if name == 'h' else (sf, sg)
+        states['x'] = (value - f) / (g - f)
+        sat = states['x'] <= 1.0
+        sup = ~sat
+    region[sat] = SATURATED
+    region[sup] = SUPERHEATED
+
+    #mix the saturated liquid and vapor properties
+    q = states['x'][sat]
+    states['T'][sat] = Tsat[sat]
+    for k, f, g in (('h', hf, hg), ('s', sf, sg), ('v', vf, vg)):
+        if k != name:
+            states[k][sat] = f[sat] + q * (g[sat] - f[sat])
+
+    #interpolate the superheated table with the given property & P
+    if np.any(sup):
+        interpolator, names = getSuperheatedInterpolator(name)
+        values = interpolator(value[sup], p[sup])
+        for i, k in enumerate(names):
+            states[k][sup] = values[..., i]
+    states.update(p=p.copy(), hf=np.array(hf), region=region)
+    return states
+
 def main():
     """Display an example of steam calls and calculations to prove
     functionality to user before progessing. This is done by creating